@@ -0,0 +1,28 @@
+"""Add diff_truncated to pull_request_reviews
+
+Revision ID: 1e7a3b9c5d20
+Revises: d5b8f3a61e92
+Create Date: 2026-10-18 11:26:52.331478
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1e7a3b9c5d20'
+down_revision: Union[str, Sequence[str], None] = 'd5b8f3a61e92'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('pull_request_reviews', sa.Column('diff_truncated', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('pull_request_reviews', 'diff_truncated')
@@ -0,0 +1,40 @@
+"""Add review queue columns to pull_request_reviews
+
+Revision ID: 3f2a9c1d7b64
+Revises: b271711dded4
+Create Date: 2026-10-18 09:12:41.218305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f2a9c1d7b64'
+down_revision: Union[str, Sequence[str], None] = 'b271711dded4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('pull_request_reviews', sa.Column('head_sha', sa.String(), nullable=True))
+    op.add_column('pull_request_reviews', sa.Column('diff_url', sa.String(), nullable=True))
+    op.add_column('pull_request_reviews', sa.Column('attempts', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('pull_request_reviews', sa.Column('last_error', sa.Text(), nullable=True))
+    op.add_column('pull_request_reviews', sa.Column('available_at', sa.DateTime(), nullable=True))
+    op.add_column('pull_request_reviews', sa.Column('started_at', sa.DateTime(), nullable=True))
+    op.create_index('ix_pull_request_reviews_status_available_at', 'pull_request_reviews', ['status', 'available_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_pull_request_reviews_status_available_at', table_name='pull_request_reviews')
+    op.drop_column('pull_request_reviews', 'started_at')
+    op.drop_column('pull_request_reviews', 'available_at')
+    op.drop_column('pull_request_reviews', 'last_error')
+    op.drop_column('pull_request_reviews', 'attempts')
+    op.drop_column('pull_request_reviews', 'diff_url')
+    op.drop_column('pull_request_reviews', 'head_sha')
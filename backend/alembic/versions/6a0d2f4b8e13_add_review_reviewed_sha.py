@@ -0,0 +1,28 @@
+"""Add reviewed_sha to pull_request_reviews for incremental re-reviews
+
+Revision ID: 6a0d2f4b8e13
+Revises: 1e7a3b9c5d20
+Create Date: 2026-10-18 12:08:39.904217
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6a0d2f4b8e13'
+down_revision: Union[str, Sequence[str], None] = '1e7a3b9c5d20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('pull_request_reviews', sa.Column('reviewed_sha', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('pull_request_reviews', 'reviewed_sha')
@@ -0,0 +1,28 @@
+"""Add queued_at to pull_request_reviews for debounced re-reviews
+
+Revision ID: 8c41e07d2a5f
+Revises: 3f2a9c1d7b64
+Create Date: 2026-10-18 10:03:17.540912
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c41e07d2a5f'
+down_revision: Union[str, Sequence[str], None] = '3f2a9c1d7b64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('pull_request_reviews', sa.Column('queued_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('pull_request_reviews', 'queued_at')
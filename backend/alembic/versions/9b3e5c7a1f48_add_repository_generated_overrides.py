@@ -0,0 +1,28 @@
+"""Add generated_overrides to repositories
+
+Revision ID: 9b3e5c7a1f48
+Revises: 6a0d2f4b8e13
+Create Date: 2026-10-18 13:02:17.451873
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b3e5c7a1f48'
+down_revision: Union[str, Sequence[str], None] = '6a0d2f4b8e13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('repositories', sa.Column('generated_overrides', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('repositories', 'generated_overrides')
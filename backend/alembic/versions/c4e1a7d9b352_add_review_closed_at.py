@@ -0,0 +1,28 @@
+"""Add closed_at to pull_request_reviews
+
+Revision ID: c4e1a7d9b352
+Revises: 9b3e5c7a1f48
+Create Date: 2026-10-18 16:41:05.208314
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e1a7d9b352'
+down_revision: Union[str, Sequence[str], None] = '9b3e5c7a1f48'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('pull_request_reviews', sa.Column('closed_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('pull_request_reviews', 'closed_at')
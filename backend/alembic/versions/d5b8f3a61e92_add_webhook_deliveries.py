@@ -0,0 +1,35 @@
+"""Add webhook_deliveries table for delivery dedup
+
+Revision ID: d5b8f3a61e92
+Revises: 8c41e07d2a5f
+Create Date: 2026-10-18 10:41:05.118734
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5b8f3a61e92'
+down_revision: Union[str, Sequence[str], None] = '8c41e07d2a5f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('webhook_deliveries',
+    sa.Column('delivery_id', sa.String(), nullable=False),
+    sa.Column('event', sa.String(), nullable=True),
+    sa.Column('received_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('delivery_id')
+    )
+    op.create_index(op.f('ix_webhook_deliveries_received_at'), 'webhook_deliveries', ['received_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_webhook_deliveries_received_at'), table_name='webhook_deliveries')
+    op.drop_table('webhook_deliveries')
@@ -0,0 +1,28 @@
+"""Add claim_token to pull_request_reviews
+
+Revision ID: e7d2b9a4c615
+Revises: c4e1a7d9b352
+Create Date: 2026-10-18 19:12:44.531907
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7d2b9a4c615'
+down_revision: Union[str, Sequence[str], None] = 'c4e1a7d9b352'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('pull_request_reviews', sa.Column('claim_token', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('pull_request_reviews', 'claim_token')
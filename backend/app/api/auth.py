@@ -10,7 +10,7 @@ from ..services.auth import (
     verify_token, 
     exchange_github_code_for_token,
     get_github_user,
-    get_github_user_repos,
+    iter_github_user_repos,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
 from datetime import timedelta
@@ -128,11 +128,9 @@ async def sync_user_repositories(current_user: models.User = Depends(get_current
                 detail="GitHub access token not available"
             )
         
-        # Get repositories from GitHub
-        github_repos = await get_github_user_repos(current_user.github_access_token)
-        
+        # Stream repositories from GitHub; pages are fetched concurrently
         synced_repos = []
-        for github_repo in github_repos:
+        async for github_repo in iter_github_user_repos(current_user.github_access_token):
             # Check if repository already exists
             existing_repo = crud.get_repository_by_github_id(db, github_id=github_repo["id"])
             
@@ -1,6 +1,15 @@
 # app/api/health.py
 from fastapi import APIRouter
 from ..db.database import engine
+from ..services.http import get_http_metrics
+from ..services.http_cache import get_conditional_cache
+from ..services.rate_limit import get_rate_limit_stats
+from ..services.file_classifier import get_skip_stats
+from ..services.embedding_cache import get_embedding_cache, EMBEDDING_CACHE_ENABLED
+from ..services.embedding import get_embedding_batcher
+from ..services.pr_index import get_pr_index
+from ..services.retrieval_cache import get_retrieval_cache_stats
+from ..services.chunk_selection import get_dedup_stats
 
 router = APIRouter(prefix="/api", tags=["health"])
 
@@ -13,3 +22,24 @@ def health_check():
         return {"status": "ok", "db": "connected"}
     except Exception as e:
         return {"status": "fail", "db": str(e)}
+
+@router.get("/health/http")
+def http_client_metrics():
+    """Connection reuse, conditional-request cache and rate-limit state for GitHub traffic"""
+    return {
+        **get_http_metrics(),
+        "cache": get_conditional_cache().stats(),
+        "rate_limits": get_rate_limit_stats(),
+    }
+
+@router.get("/health/ingest")
+def ingest_metrics():
+    """What the embedding pipeline left out, and how often it reused cached vectors"""
+    return {
+        "skipped": get_skip_stats(),
+        "embedding_cache": get_embedding_cache().stats() if EMBEDDING_CACHE_ENABLED else None,
+        "embedding_batches": get_embedding_batcher().stats(),
+        "pr_index": get_pr_index().stats(),
+        "retrieval_cache": get_retrieval_cache_stats(),
+        "prompt_dedup": get_dedup_stats(),
+    }
@@ -3,6 +3,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from ..db import crud, schemas, models
 from ..db.database import get_db
+from ..services.similar_changes import find_similar_prs, find_similar_hunks
 
 router = APIRouter(prefix="/api/repositories", tags=["repositories"])
 
@@ -16,3 +17,26 @@ def create_repository(repo_in: schemas.RepositoryCreate, db: Session = Depends(g
 @router.get("/", response_model=list[schemas.RepositoryOut])
 def list_repositories(skip: int = 0, limit: int = 50, db: Session = Depends(get_db)):
     return crud.list_repositories(db, skip=skip, limit=limit)
+
+@router.patch("/{repo_id}", response_model=schemas.RepositoryOut)
+def update_repository(repo_id: int, patch: schemas.RepositoryUpdate, db: Session = Depends(get_db)):
+    repo = crud.get_repository(db, repo_id)
+    if not repo:
+        raise HTTPException(status_code=404, detail="Repository not found")
+    return crud.update_repository(db, repo, patch)
+
+@router.get("/{repo_id}/pulls/{pr_number}/similar", response_model=list[schemas.SimilarPullRequest])
+def similar_pull_requests(repo_id: int, pr_number: int, top_k: int = 10, db: Session = Depends(get_db)):
+    """Past PRs of the repository with the most similar changes"""
+    repo = crud.get_repository(db, repo_id)
+    if not repo:
+        raise HTTPException(status_code=404, detail="Repository not found")
+    return find_similar_prs(repo.full_name, pr_number, top_k=min(top_k, 50))
+
+@router.post("/{repo_id}/similar-hunks", response_model=list[schemas.SimilarHunk])
+def similar_hunks(repo_id: int, query: schemas.SimilarHunkQuery, db: Session = Depends(get_db)):
+    """Past hunks of the repository most similar to the given diff text"""
+    repo = crud.get_repository(db, repo_id)
+    if not repo:
+        raise HTTPException(status_code=404, detail="Repository not found")
+    return find_similar_hunks(repo.full_name, query.text, top_k=min(query.top_k, 50), exclude_pr=query.exclude_pr)
@@ -1,9 +1,98 @@
+# app/chroma.py
+import os
+import hashlib
+from typing import Optional
 import chromadb
+from chromadb.config import Settings
 
-# New way to initialize ChromaDB client
-chroma_client = chromadb.PersistentClient(path=".chromadb")  # For persistent storage
-# OR for in-memory only:
-# chroma_client = chromadb.EphemeralClient()
+# One vector store for every worker process:
+# - CHROMA_SERVER_HOST set: talk to a Chroma server (safe for any number of uvicorn workers/hosts)
+# - otherwise: an on-disk store under CHROMA_PERSIST_DIR (single process only)
+CHROMA_SERVER_HOST = os.getenv("CHROMA_SERVER_HOST")
+CHROMA_SERVER_PORT = int(os.getenv("CHROMA_SERVER_PORT", "8000"))
+CHROMA_PERSIST_DIR = os.getenv("CHROMA_PERSIST_DIR", ".chromadb")
+CHROMA_COLLECTION = os.getenv("CHROMA_COLLECTION", "pr-diffs")   # prefix; each repository gets its own collection
+CHROMA_HISTORY_COLLECTION = os.getenv("CHROMA_HISTORY_COLLECTION", "pr-history")  # prefix of the per-repo history indexes
+# HNSW parameters of the history indexes (cosine; vectors are unit length)
+CHROMA_HISTORY_M = int(os.getenv("CHROMA_HISTORY_M", "16"))
+CHROMA_HISTORY_CONSTRUCTION_EF = int(os.getenv("CHROMA_HISTORY_CONSTRUCTION_EF", "128"))
+CHROMA_HISTORY_SEARCH_EF = int(os.getenv("CHROMA_HISTORY_SEARCH_EF", "64"))
 
-# Create/get collection
-collection = chroma_client.get_or_create_collection(name="my_collection")
\ No newline at end of file
+# Global instances
+chroma_client = None
+collections = {}
+
+def get_chroma_client():
+    """Get or create the configured Chroma client"""
+    global chroma_client
+    if chroma_client is None:
+        settings = Settings(anonymized_telemetry=False)
+        if CHROMA_SERVER_HOST:
+            chroma_client = chromadb.HttpClient(host=CHROMA_SERVER_HOST, port=CHROMA_SERVER_PORT, settings=settings)
+            print(f"✅ Using Chroma server at {CHROMA_SERVER_HOST}:{CHROMA_SERVER_PORT}")
+        else:
+            if int(os.getenv("WEB_CONCURRENCY", "1")) > 1:
+                print("⚠️ Several workers share an embedded Chroma store; set CHROMA_SERVER_HOST to use a Chroma server")
+            chroma_client = chromadb.PersistentClient(path=CHROMA_PERSIST_DIR, settings=settings)
+            print(f"✅ Using persistent Chroma store at {CHROMA_PERSIST_DIR}")
+    return chroma_client
+
+def collection_name(repo_full: str, prefix: str = CHROMA_COLLECTION) -> str:
+    # Chroma names allow 3-63 of [a-zA-Z0-9._-]; hash the repo name to fit any owner/repo
+    return f"{prefix}-{hashlib.sha1(repo_full.lower().encode()).hexdigest()[:16]}"
+
+def get_collection(repo_full: str):
+    """The chunk collection of one repository (index segments load lazily on first query, not at startup)"""
+    name = collection_name(repo_full)
+    if name not in collections:
+        collections[name] = get_chroma_client().get_or_create_collection(name, metadata={"repo": repo_full})
+    return collections[name]
+
+def get_history_collection(repo_full: str, dims: Optional[int] = None):
+    """Approximate-nearest-neighbour index over the latest chunks of every PR a repository ever had.
+
+    Unlike the live collection it is not cleaned up when PRs close, so it keeps prior
+    art searchable across the repository's history. With `dims` (a PCA projection is
+    active) the vectors live in a separate, smaller index.
+    """
+    prefix = f"{CHROMA_HISTORY_COLLECTION}-p{dims}" if dims else CHROMA_HISTORY_COLLECTION
+    name = collection_name(repo_full, prefix)
+    if name not in collections:
+        collections[name] = get_chroma_client().get_or_create_collection(name, metadata={
+            "repo": repo_full,
+            "hnsw:space": "cosine",
+            "hnsw:M": CHROMA_HISTORY_M,
+            "hnsw:construction_ef": CHROMA_HISTORY_CONSTRUCTION_EF,
+            "hnsw:search_ef": CHROMA_HISTORY_SEARCH_EF,
+        })
+    return collections[name]
+
+def list_repo_collections() -> list:
+    """Every per-repository live chunk collection in the store (history indexes excluded)"""
+    found = []
+    for item in get_chroma_client().list_collections():
+        name = getattr(item, "name", item)   # newer clients return bare names
+        if name.startswith(f"{CHROMA_COLLECTION}-"):
+            if name not in collections:
+                collections[name] = get_chroma_client().get_collection(name)
+            found.append(collections[name])
+    return found
+
+def list_history_collections() -> list:
+    """Every per-repository full-dimension history index (PCA-projected ones excluded)"""
+    found = []
+    for item in get_chroma_client().list_collections():
+        name = getattr(item, "name", item)
+        suffix = name[len(CHROMA_HISTORY_COLLECTION) + 1:] if name.startswith(f"{CHROMA_HISTORY_COLLECTION}-") else ""
+        if len(suffix) == 16:   # "<prefix>-<repo hash>", not "<prefix>-p<dims>-<repo hash>"
+            if name not in collections:
+                collections[name] = get_chroma_client().get_collection(name)
+            found.append(collections[name])
+    return found
+
+def get_chroma_max_batch_size() -> int:
+    """Largest number of records one add/upsert call may carry"""
+    try:
+        return get_chroma_client().get_max_batch_size()
+    except Exception:
+        return 5000  # older clients do not expose it
@@ -2,7 +2,10 @@
 from sqlalchemy.orm import Session
 from . import models, schemas
 from typing import List, Optional
+from datetime import datetime, timedelta
+import uuid
 from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
 
 # User operations
 def create_user(db: Session, user: schemas.UserCreate) -> models.User:
@@ -56,6 +59,15 @@ def get_repository_by_fullname(db: Session, full_name: str) -> Optional[models.R
 def get_repository_by_github_id(db: Session, github_id: int) -> Optional[models.Repository]:
     return db.query(models.Repository).filter(models.Repository.github_id == github_id).first()
 
+def update_repository(db: Session, repo: models.Repository, repo_update: schemas.RepositoryUpdate) -> models.Repository:
+    update_data = repo_update.dict(exclude_unset=True)
+    for field, value in update_data.items():
+        setattr(repo, field, value)
+    db.add(repo)
+    db.commit()
+    db.refresh(repo)
+    return repo
+
 def list_repositories(db: Session, skip: int = 0, limit: int = 100) -> List[models.Repository]:
     return db.query(models.Repository).offset(skip).limit(limit).all()
 
@@ -120,6 +132,249 @@ def list_user_reviews(db: Session, user_id: int, repo_id: Optional[int] = None,
     items = q.order_by(models.PullRequestReview.created_at.desc()).offset(skip).limit(limit).all()
     return {"total": total, "items": items}
 
+# Review queue
+def get_or_create_repository(db: Session, full_name: str, github_id: Optional[int] = None) -> models.Repository:
+    """The repository row for a webhook, matched by GitHub ID first so renames and transfers keep their row"""
+    repo = get_repository_by_github_id(db, github_id) if github_id is not None else None
+    if repo is None:
+        repo = db.query(models.Repository).filter(func.lower(models.Repository.full_name) == full_name.lower()).first()
+    if repo:
+        if repo.full_name != full_name or (github_id is not None and repo.github_id != github_id):
+            repo.full_name = full_name
+            repo.name = full_name.split("/")[-1]
+            repo.github_id = github_id if github_id is not None else repo.github_id
+            db.add(repo)
+            db.commit()
+            db.refresh(repo)
+        return repo
+    return create_repository(db, schemas.RepositoryCreate(
+        github_id=github_id,
+        full_name=full_name,
+        name=full_name.split("/")[-1],
+    ))
+
+def enqueue_review(db: Session, repo_id: int, pr_number: int, head_sha: Optional[str], diff_url: str,
+                   title: Optional[str] = None, author: Optional[str] = None,
+                   debounce: float = 0, max_wait: float = 0) -> models.PullRequestReview:
+    """Create or reset the review row for a PR so a worker picks it up.
+
+    Events arriving while the row is still pending collapse into one job for the
+    newest head: the row keeps a single `head_sha` and its `available_at` slides
+    `debounce` seconds past the latest event, capped at `max_wait` seconds after the
+    first event of the burst. A claim ends the burst, so a push during a running review
+    starts a new one (and supersedes the running job). A row already being processed
+    for the same head is left alone: resetting it to pending would let a second worker
+    claim it while the first one still counts as current.
+    """
+    now = datetime.utcnow()
+    review = get_review_by_pr(db, repo_id, pr_number)
+    if review is None:
+        review = models.PullRequestReview(repo_id=repo_id, pr_number=pr_number)
+    elif review.status == models.ReviewStatus.processing and head_sha is not None and review.head_sha == head_sha:
+        db.commit()  # the caller's delivery record rides on this transaction
+        return review
+    in_burst = review.status == models.ReviewStatus.pending and review.queued_at is not None
+    if not in_burst:
+        review.queued_at = now
+    available_at = now + timedelta(seconds=debounce)
+    if max_wait:
+        available_at = min(available_at, review.queued_at + timedelta(seconds=max_wait))
+    review.title = title or review.title
+    review.author = author or review.author
+    review.head_sha = head_sha
+    review.diff_url = diff_url
+    review.status = models.ReviewStatus.pending
+    review.attempts = 0
+    review.last_error = None
+    review.started_at = None
+    review.claim_token = None
+    review.available_at = available_at
+    review.closed_at = None
+    db.add(review)
+    db.commit()
+    db.refresh(review)
+    return review
+
+def _held(review_id: int, claim_token: str) -> tuple:
+    """Filters matching a review still processing under the given claim"""
+    return (
+        models.PullRequestReview.id == review_id,
+        models.PullRequestReview.status == models.ReviewStatus.processing,
+        models.PullRequestReview.claim_token == claim_token,
+    )
+
+def is_review_current(db: Session, review_id: int, claim_token: str) -> bool:
+    """True while the claim is still the one processing the review.
+
+    A newer head resets the row to pending, and an expired lease hands it to another
+    worker under a new token; either way the old worker stops being current.
+    """
+    return db.query(models.PullRequestReview.id).filter(*_held(review_id, claim_token)).first() is not None
+
+def close_review(db: Session, repo_id: int, pr_number: int) -> Optional[models.PullRequestReview]:
+    """Record that a PR was closed and cancel its queued or running review.
+
+    A worker still processing the row sees it is no longer current at its next
+    check and stops before posting on the closed PR.
+    """
+    review = get_review_by_pr(db, repo_id, pr_number)
+    if review is None:
+        return None
+    review.closed_at = datetime.utcnow()
+    if review.status in (models.ReviewStatus.pending, models.ReviewStatus.processing):
+        # Keep the last finished review if there is one; otherwise nothing was ever reviewed
+        if review.reviewed_sha:
+            review.status = models.ReviewStatus.done
+            review.head_sha = review.reviewed_sha
+        else:
+            review.status = models.ReviewStatus.failed
+            review.last_error = "PR closed before it was reviewed"
+        review.started_at = None
+        review.claim_token = None
+        review.queued_at = None
+    db.add(review)
+    db.commit()
+    db.refresh(review)
+    return review
+
+def is_review_closed(db: Session, review_id: int) -> bool:
+    return db.query(models.PullRequestReview.id).filter(
+        models.PullRequestReview.id == review_id,
+        models.PullRequestReview.closed_at != None  # noqa: E711
+    ).first() is not None
+
+def list_open_prs(db: Session) -> dict:
+    """{repo full name: {PR numbers}} of reviewed PRs that have not been closed"""
+    rows = db.query(models.Repository.full_name, models.PullRequestReview.pr_number).join(
+        models.PullRequestReview, models.PullRequestReview.repo_id == models.Repository.id
+    ).filter(models.PullRequestReview.closed_at == None).all()  # noqa: E711
+    open_prs = {}
+    for full_name, pr_number in rows:
+        open_prs.setdefault(full_name, set()).add(pr_number)
+    return open_prs
+
+def claim_next_review(db: Session, batch: int = 5) -> Optional[models.PullRequestReview]:
+    """Atomically move the oldest due pending review to processing and return it.
+
+    The claim is a compare-and-set UPDATE on `status`, so it is safe with several
+    workers (threads or processes) polling the same SQLite/Postgres table. Each claim
+    stores a fresh `claim_token`, which the worker passes back to every later
+    transition so a worker whose lease expired cannot act on the row. Only rows
+    queued by `enqueue_review` (which carry a diff URL) are jobs; pending rows created
+    through the API or before the queue existed are left alone.
+    """
+    now = datetime.utcnow()
+    candidates = db.query(models.PullRequestReview.id).filter(
+        models.PullRequestReview.status == models.ReviewStatus.pending,
+        models.PullRequestReview.diff_url != None,  # noqa: E711
+        (models.PullRequestReview.available_at == None) | (models.PullRequestReview.available_at <= now)  # noqa: E711
+    ).order_by(models.PullRequestReview.available_at, models.PullRequestReview.id).limit(batch).all()
+
+    for (review_id,) in candidates:
+        claim_token = uuid.uuid4().hex
+        claimed = db.query(models.PullRequestReview).filter(
+            models.PullRequestReview.id == review_id,
+            models.PullRequestReview.status == models.ReviewStatus.pending
+        ).update({
+            models.PullRequestReview.status: models.ReviewStatus.processing,
+            models.PullRequestReview.started_at: now,
+            models.PullRequestReview.claim_token: claim_token,
+            models.PullRequestReview.queued_at: None,   # the burst ends here; later pushes start a new one
+            models.PullRequestReview.attempts: models.PullRequestReview.attempts + 1,
+        }, synchronize_session=False)
+        db.commit()
+        if claimed:
+            return get_review(db, review_id)
+    return None
+
+def complete_review(db: Session, review_id: int, claim_token: str, head_sha: Optional[str], summary: str,
+                    diff_truncated: Optional[str] = None) -> bool:
+    """Mark a claimed review done; returns False if the claim was lost (newer head, expired lease)"""
+    updated = db.query(models.PullRequestReview).filter(*_held(review_id, claim_token)).update({
+        models.PullRequestReview.status: models.ReviewStatus.done,
+        models.PullRequestReview.summary: summary,
+        models.PullRequestReview.reviewed_sha: head_sha,
+        models.PullRequestReview.diff_truncated: diff_truncated,
+        models.PullRequestReview.last_error: None,
+        models.PullRequestReview.started_at: None,
+        models.PullRequestReview.claim_token: None,
+        models.PullRequestReview.queued_at: None,
+    }, synchronize_session=False)
+    db.commit()
+    return bool(updated)
+
+def fail_review(db: Session, review_id: int, claim_token: str, error: str,
+                max_attempts: int, retry_delay: float) -> Optional[models.ReviewStatus]:
+    """Record a failed attempt: re-queue with backoff, or give up after `max_attempts`"""
+    review = db.query(models.PullRequestReview).filter(*_held(review_id, claim_token)).first()
+    if review is None:
+        return None
+    review.last_error = error
+    review.started_at = None
+    review.claim_token = None
+    if review.attempts >= max_attempts:
+        review.status = models.ReviewStatus.failed
+        review.queued_at = None
+    else:
+        review.status = models.ReviewStatus.pending
+        review.available_at = datetime.utcnow() + timedelta(seconds=retry_delay * 2 ** (review.attempts - 1))
+    db.add(review)
+    db.commit()
+    return review.status
+
+def release_review(db: Session, review_id: int, claim_token: str):
+    """Hand a claimed review back to the queue without counting the attempt"""
+    db.query(models.PullRequestReview).filter(*_held(review_id, claim_token)).update({
+        models.PullRequestReview.status: models.ReviewStatus.pending,
+        models.PullRequestReview.attempts: models.PullRequestReview.attempts - 1,
+        models.PullRequestReview.started_at: None,
+        models.PullRequestReview.claim_token: None,
+    }, synchronize_session=False)
+    db.commit()
+
+def requeue_stale_reviews(db: Session, lease_seconds: float) -> int:
+    """Return reviews whose worker died or stalled mid-flight (expired lease) to pending.
+
+    The claim token is cleared, so if the old worker is still running it is no longer
+    current and cannot complete, fail or release the row.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=lease_seconds)
+    count = db.query(models.PullRequestReview).filter(
+        models.PullRequestReview.status == models.ReviewStatus.processing,
+        (models.PullRequestReview.started_at == None) | (models.PullRequestReview.started_at < cutoff)  # noqa: E711
+    ).update({
+        models.PullRequestReview.status: models.ReviewStatus.pending,
+        models.PullRequestReview.started_at: None,
+        models.PullRequestReview.claim_token: None,
+    }, synchronize_session=False)
+    db.commit()
+    return count
+
+# Webhook deliveries
+def record_delivery(db: Session, delivery_id: str, event: Optional[str] = None) -> bool:
+    """Claim a delivery ID; returns False if it was already seen.
+
+    Only flushes: the caller commits together with the work the delivery triggers, so a
+    delivery whose handling failed is not remembered and GitHub's redelivery goes through.
+    """
+    if db.query(models.WebhookDelivery.delivery_id).filter(models.WebhookDelivery.delivery_id == delivery_id).first():
+        return False
+    db.add(models.WebhookDelivery(delivery_id=delivery_id, event=event, received_at=datetime.utcnow()))
+    try:
+        db.flush()
+    except IntegrityError:
+        # Lost a race against a concurrent copy of the same delivery
+        db.rollback()
+        return False
+    return True
+
+def purge_deliveries(db: Session, ttl_seconds: float) -> int:
+    """Forget deliveries older than the TTL"""
+    cutoff = datetime.utcnow() - timedelta(seconds=ttl_seconds)
+    count = db.query(models.WebhookDelivery).filter(models.WebhookDelivery.received_at < cutoff).delete(synchronize_session=False)
+    db.commit()
+    return count
+
 def get_dashboard_stats(db: Session):
     total_repos = db.query(func.count(models.Repository.id)).scalar()
     total_reviews = db.query(func.count(models.PullRequestReview.id)).scalar()
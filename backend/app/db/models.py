@@ -1,5 +1,5 @@
 # app/db/models.py
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Enum, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Enum, Boolean, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import enum
@@ -38,6 +38,7 @@ class Repository(Base):
     description = Column(String, nullable=True)
     default_branch = Column(String, nullable=True)
     is_private = Column(Boolean, default=False)
+    generated_overrides = Column(Text, nullable=True)  # .gitattributes-style rules, e.g. "docs/api/** linguist-generated"
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)  # Owner of the repo
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
@@ -56,7 +57,30 @@ class PullRequestReview(Base):
     repo_id = Column(Integer, ForeignKey("repositories.id"))
     status = Column(Enum(ReviewStatus), default=ReviewStatus.pending)
     summary = Column(Text, nullable=True)           # AI-generated summary text
+    # Review queue bookkeeping (rows double as durable jobs driven by `status`)
+    head_sha = Column(String, nullable=True)        # PR head the pending job should review
+    reviewed_sha = Column(String, nullable=True)    # head the current summary describes
+    diff_url = Column(String, nullable=True)
+    diff_truncated = Column(String, nullable=True)  # why the reviewed diff was cut short, if it was
+    attempts = Column(Integer, default=0, nullable=False)
+    last_error = Column(Text, nullable=True)
+    available_at = Column(DateTime, nullable=True)  # job is not claimable before this (UTC)
+    queued_at = Column(DateTime, nullable=True)     # first event of the current debounce burst
+    started_at = Column(DateTime, nullable=True)    # lease start while status == processing
+    claim_token = Column(String, nullable=True)     # identifies the worker holding the lease; new on every claim
+    closed_at = Column(DateTime, nullable=True)     # PR closed or merged; cleared when it is reopened
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
     repository = relationship("Repository", back_populates="pull_requests")
+
+    __table_args__ = (
+        Index("ix_pull_request_reviews_status_available_at", "status", "available_at"),
+    )
+
+class WebhookDelivery(Base):
+    __tablename__ = "webhook_deliveries"
+
+    delivery_id = Column(String, primary_key=True)  # X-GitHub-Delivery GUID
+    event = Column(String, nullable=True)
+    received_at = Column(DateTime, nullable=False, index=True)
@@ -56,6 +56,11 @@ class RepositoryCreate(BaseModel):
     default_branch: Optional[str] = None
     is_private: Optional[bool] = False
 
+class RepositoryUpdate(BaseModel):
+    description: Optional[str] = None
+    default_branch: Optional[str] = None
+    generated_overrides: Optional[str] = None
+
 class RepositoryOut(BaseModel):
     id: int
     github_id: Optional[int]
@@ -64,6 +69,7 @@ class RepositoryOut(BaseModel):
     description: Optional[str]
     default_branch: Optional[str]
     is_private: bool
+    generated_overrides: Optional[str] = None
     user_id: Optional[int]
     created_at: datetime
 
@@ -89,6 +95,11 @@ class ReviewOut(BaseModel):
     repo_id: int
     status: ReviewStatus
     summary: Optional[str]
+    head_sha: Optional[str] = None
+    diff_truncated: Optional[str] = None
+    attempts: int = 0
+    last_error: Optional[str] = None
+    closed_at: Optional[datetime] = None
     created_at: datetime
     updated_at: datetime
 
@@ -100,6 +111,27 @@ class ReviewListResponse(BaseModel):
     total: int
     items: List[ReviewOut]
 
+# Similar-changes schemas
+class SimilarHunkQuery(BaseModel):
+    text: str
+    top_k: int = 10
+    exclude_pr: Optional[int] = None
+
+class SimilarHunk(BaseModel):
+    pr_number: int
+    file: Optional[str] = None
+    language: Optional[str] = None
+    new_start: Optional[int] = None
+    new_end: Optional[int] = None
+    similarity: float
+    text: str
+
+class SimilarPullRequest(BaseModel):
+    pr_number: int
+    score: float
+    matched_chunks: int
+    files: List[str] = []
+
 # Dashboard schemas
 class DashboardStats(BaseModel):
     total_repositories: int
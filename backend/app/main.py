@@ -1,7 +1,15 @@
 # app/main.py
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from .api import reviews, repositories, dashboard, health, auth
+from .routes.webhook import router as webhook_router
+from .services.review_queue import get_review_worker_pool
+from .services.http import close_http_client
+from .services.embedding import get_embedding_batcher, get_embedding_pool, backfill_projected_history
+from .services.compaction import get_history_projection
+from .services.executors import shutdown_executors, run_io
+from .chroma import list_repo_collections
 from .db import models
 from .db.database import engine
 
@@ -24,3 +32,34 @@ app.include_router(repositories.router)
 app.include_router(reviews.router)
 app.include_router(dashboard.router)
 app.include_router(health.router)
+app.include_router(webhook_router)
+
+@app.on_event("startup")
+async def start_review_workers():
+    # Open the vector store up front; Chroma loads index segments lazily, so this stays cheap
+    collections = await run_io(list_repo_collections)
+    print(f"✅ Vector store ready ({len(collections)} repository collections)")
+    if get_history_projection() is not None:
+        # A new projection starts from empty history indexes; copy the full-dimension ones in the background
+        asyncio.create_task(_backfill_history())
+    pool = get_embedding_pool()
+    if pool is not None:
+        pool.warm_up()
+    await get_review_worker_pool().start()
+
+async def _backfill_history():
+    try:
+        copied = await run_io(backfill_projected_history)
+        if copied:
+            print(f"✅ History backfill done ({copied} chunk(s) projected)")
+    except Exception as e:
+        print(f"❌ History backfill failed: {e}")
+
+@app.on_event("shutdown")
+async def stop_review_workers():
+    await get_review_worker_pool().stop()
+    await close_http_client()
+    get_embedding_batcher().close()
+    if get_embedding_pool() is not None:
+        get_embedding_pool().shutdown()
+    shutdown_executors()
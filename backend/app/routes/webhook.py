@@ -1,13 +1,18 @@
 import os
 import hmac
 import hashlib
-from fastapi import APIRouter, Request, Header, HTTPException, Body
+from typing import Optional
+from fastapi import APIRouter, Request, Header, HTTPException, Body, Depends
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
+from sqlalchemy.orm import Session
 from dotenv import load_dotenv
 
-from ..services.github   import fetch_diff, post_comment
-from ..services.embedding import ingest_diff
-from ..services.review    import make_summary
+from ..db import crud
+from ..db.database import get_db
+from ..services.review_queue import get_review_worker_pool, REVIEW_DEBOUNCE_SECONDS, REVIEW_DEBOUNCE_MAX_WAIT
+from ..services.embedding import delete_pr_chunks
+from ..services.executors import run_io
 
 load_dotenv()
 router = APIRouter()
@@ -17,6 +22,8 @@ GITHUB_SECRET = os.getenv("GITHUB_WEBHOOK_SECRET", "")
 class PullRequestPayload(BaseModel):
     action: str
     pull_request: dict
+    before: Optional[str] = None    # previous head, on "synchronize"
+    after: Optional[str] = None     # new head, on "synchronize"
 
 def verify_signature(raw_body: bytes, signature: str):
     mac = hmac.new(GITHUB_SECRET.encode(), msg=raw_body, digestmod=hashlib.sha256)
@@ -28,24 +35,50 @@ def verify_signature(raw_body: bytes, signature: str):
 async def github_webhook(
     request: Request,
     x_hub_signature_256: str = Header(...),
-    payload: PullRequestPayload = Body(...)      # ← tell FastAPI to expect this JSON body
+    x_github_delivery: Optional[str] = Header(None),
+    x_github_event: Optional[str] = Header(None),
+    payload: PullRequestPayload = Body(...),     # ← tell FastAPI to expect this JSON body
+    db: Session = Depends(get_db),
 ):
     # 1) Read raw body for signature check
     raw_body = await request.body()
     # verify_signature(raw_body, x_hub_signature_256)  # comment out or use SKIP flag in dev
 
     # 2) Use the already-parsed `payload`
-    if payload.action in ("opened", "synchronize"):
+    if payload.action in ("opened", "synchronize", "reopened"):
         pr   = payload.pull_request
         pr_num = pr["number"]
-        repo_full = pr["base"]["repo"]["full_name"]
+        base_repo = pr["base"]["repo"]
         diff_url  = pr["diff_url"]
 
-        diff_text = fetch_diff(diff_url)
-        ingest_diff(pr_num, diff_text)
-        summary = make_summary(pr_num)
-        post_comment(pr_num, repo_full, summary)
+        # 3) Persist the job and return; the review worker pool does the heavy lifting
+        repo = crud.get_or_create_repository(db, base_repo["full_name"], github_id=base_repo.get("id"))
+        # Redeliveries of an accepted delivery stop here; the ID is committed with the job below
+        if x_github_delivery and not crud.record_delivery(db, x_github_delivery, x_github_event):
+            return {"status": "duplicate", "pr": pr_num, "delivery": x_github_delivery}
+        review = crud.enqueue_review(
+            db,
+            repo_id=repo.id,
+            pr_number=pr_num,
+            head_sha=payload.after or pr.get("head", {}).get("sha"),
+            diff_url=diff_url,
+            title=pr.get("title"),
+            author=pr.get("user", {}).get("login"),
+            debounce=REVIEW_DEBOUNCE_SECONDS,
+            max_wait=REVIEW_DEBOUNCE_MAX_WAIT,
+        )
+        get_review_worker_pool().notify()
 
-        return {"status": "processed", "pr": pr_num}
+        return JSONResponse(status_code=202, content={"status": "queued", "pr": pr_num, "review_id": review.id})
+
+    if payload.action == "closed":
+        # Closed or merged: cancel any review still queued for it; its chunks are no longer needed for Q&A
+        pr = payload.pull_request
+        repo = crud.get_repository_by_fullname(db, pr["base"]["repo"]["full_name"])
+        if repo is not None:
+            crud.close_review(db, repo.id, pr["number"])
+        removed = await run_io(delete_pr_chunks, pr["number"], pr["base"]["repo"]["full_name"])
+        print(f"🗑️ PR #{pr['number']} closed; removed {removed} chunk(s)")
+        return {"status": "cleaned", "pr": pr["number"], "chunks_removed": removed}
 
     return {"status": "ignored"}
@@ -1,12 +1,16 @@
 # app/services/auth.py
 import os
+import asyncio
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, AsyncIterator
+from urllib.parse import urlparse, parse_qs
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status
-import httpx
 from ..db import schemas
+from .http import get_http_client
+from .http_cache import cached_get
+from .rate_limit import PRIORITY_INTERACTIVE, PRIORITY_BULK
 
 # Configuration
 SECRET_KEY = os.getenv("SECRET_KEY", "your-super-secret-jwt-key-here-change-in-production")
@@ -17,6 +21,8 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 # GitHub OAuth Configuration
 GITHUB_CLIENT_ID = os.getenv("GITHUB_CLIENT_ID")
 GITHUB_CLIENT_SECRET = os.getenv("GITHUB_CLIENT_SECRET")
+GITHUB_PER_PAGE = 100
+GITHUB_PAGE_CONCURRENCY = int(os.getenv("GITHUB_PAGE_CONCURRENCY", "4"))
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -53,104 +59,123 @@ def verify_token(token: str, credentials_exception):
 
 async def exchange_github_code_for_token(code: str) -> dict:
     """Exchange GitHub OAuth code for access token"""
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            "https://github.com/login/oauth/access_token",
-            data={
-                "client_id": GITHUB_CLIENT_ID,
-                "client_secret": GITHUB_CLIENT_SECRET,
-                "code": code,
-            },
-            headers={"Accept": "application/json"},
+    client = get_http_client()
+    response = await client.post(
+        "https://github.com/login/oauth/access_token",
+        data={
+            "client_id": GITHUB_CLIENT_ID,
+            "client_secret": GITHUB_CLIENT_SECRET,
+            "code": code,
+        },
+        headers={"Accept": "application/json"},
+    )
+    
+    if response.status_code != 200:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Failed to exchange code for token"
         )
-        
-        if response.status_code != 200:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Failed to exchange code for token"
-            )
-        
-        return response.json()
+    
+    return response.json()
 
 async def get_github_user(access_token: str) -> dict:
     """Get GitHub user information"""
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            "https://api.github.com/user",
-            headers={
-                "Authorization": f"token {access_token}",
-                "Accept": "application/vnd.github.v3+json",
-            },
+    response = await cached_get(
+        "https://api.github.com/user",
+        headers={
+            "Authorization": f"token {access_token}",
+            "Accept": "application/vnd.github.v3+json",
+        },
+        priority=PRIORITY_INTERACTIVE,
+    )
+    
+    if response.status_code != 200:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Failed to get user information from GitHub"
         )
-        
+    
+    return response.json()
+
+def _last_page(link_header: Optional[str]) -> Optional[int]:
+    """Extract the page number of rel="last" from a GitHub Link header"""
+    if not link_header:
+        return None
+    for part in link_header.split(","):
+        if 'rel="last"' not in part:
+            continue
+        query = parse_qs(urlparse(part.split(";")[0].strip(" <>")).query)
+        if "page" in query:
+            return int(query["page"][0])
+    return None
+
+async def _iter_github_pages(url: str, access_token: str, max_pages: int,
+                             priority: int = PRIORITY_BULK) -> AsyncIterator[list]:
+    """Yield pages of a paginated GitHub listing.
+
+    The first page is fetched alone; its Link header tells us the last page, and the
+    remaining pages are then fetched concurrently (at most GITHUB_PAGE_CONCURRENCY at a
+    time) and yielded as they arrive, so pages come back in completion order.
+    """
+    headers = {
+        "Authorization": f"token {access_token}",
+        "Accept": "application/vnd.github.v3+json",
+    }
+
+    async def fetch_page(page: int) -> list:
+        response = await cached_get(f"{url}&page={page}&per_page={GITHUB_PER_PAGE}", headers=headers, priority=priority)
         if response.status_code != 200:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Failed to get user information from GitHub"
-            )
-        
+            print(f"GitHub page {page} of {url} failed with {response.status_code}")
+            return []
         return response.json()
 
+    first = await cached_get(f"{url}&page=1&per_page={GITHUB_PER_PAGE}", headers=headers, priority=priority)
+    if first.status_code != 200:
+        return
+    first_items = first.json()
+    if not first_items:
+        return
+    yield first_items
+
+    last_page = min(_last_page(first.headers.get("link")) or 1, max_pages)
+    if last_page < 2:
+        return
+
+    semaphore = asyncio.Semaphore(GITHUB_PAGE_CONCURRENCY)
+
+    async def bounded(page: int) -> list:
+        async with semaphore:
+            return await fetch_page(page)
+
+    tasks = [asyncio.create_task(bounded(page)) for page in range(2, last_page + 1)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            items = await next_done
+            if items:
+                yield items
+    finally:
+        # The caller may stop iterating early; don't leave requests running
+        for task in tasks:
+            task.cancel()
+
+async def iter_github_user_repos(access_token: str, limit: int = 500) -> AsyncIterator[dict]:
+    """Stream the user's GitHub repositories (page order is not preserved)"""
+    url = "https://api.github.com/user/repos?sort=updated"
+    async for page in _iter_github_pages(url, access_token, max_pages=-(-limit // GITHUB_PER_PAGE)):
+        for repo in page:
+            yield repo
+
+async def iter_github_repo_prs(access_token: str, repo_full_name: str, state: str = "all", limit: int = 200) -> AsyncIterator[dict]:
+    """Stream pull requests for a repository (page order is not preserved)"""
+    url = f"https://api.github.com/repos/{repo_full_name}/pulls?state={state}&sort=updated"
+    async for page in _iter_github_pages(url, access_token, max_pages=-(-limit // GITHUB_PER_PAGE)):
+        for pr in page:
+            yield pr
+
 async def get_github_user_repos(access_token: str) -> list:
     """Get user's GitHub repositories"""
-    async with httpx.AsyncClient() as client:
-        repos = []
-        page = 1
-        per_page = 100
-        
-        while True:
-            response = await client.get(
-                f"https://api.github.com/user/repos?page={page}&per_page={per_page}&sort=updated",
-                headers={
-                    "Authorization": f"token {access_token}",
-                    "Accept": "application/vnd.github.v3+json",
-                },
-            )
-            
-            if response.status_code != 200:
-                break
-                
-            page_repos = response.json()
-            if not page_repos:
-                break
-                
-            repos.extend(page_repos)
-            page += 1
-            
-            # Limit to avoid too many requests
-            if len(repos) >= 500:
-                break
-        
-        return repos
+    return [repo async for repo in iter_github_user_repos(access_token)]
 
 async def get_github_repo_prs(access_token: str, repo_full_name: str, state: str = "all") -> list:
     """Get pull requests for a specific repository"""
-    async with httpx.AsyncClient() as client:
-        prs = []
-        page = 1
-        per_page = 100
-        
-        while True:
-            response = await client.get(
-                f"https://api.github.com/repos/{repo_full_name}/pulls?state={state}&page={page}&per_page={per_page}&sort=updated",
-                headers={
-                    "Authorization": f"token {access_token}",
-                    "Accept": "application/vnd.github.v3+json",
-                },
-            )
-            
-            if response.status_code != 200:
-                break
-                
-            page_prs = response.json()
-            if not page_prs:
-                break
-                
-            prs.extend(page_prs)
-            page += 1
-            
-            # Limit to avoid too many requests
-            if len(prs) >= 200:
-                break
-        
-        return prs
+    return [pr async for pr in iter_github_repo_prs(access_token, repo_full_name, state)]
@@ -0,0 +1,154 @@
+# app/services/chunk_selection.py
+import os
+from collections import Counter
+from typing import List, Optional, Tuple
+import numpy as np
+
+from .chunker import diff_order
+
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "1500"))  # diff tokens per summary prompt; Ollama defaults to a 2048-token context
+SUMMARY_SELECTION_MAX_CHUNKS = int(os.getenv("SUMMARY_SELECTION_MAX_CHUNKS", "2000"))  # candidates considered per PR
+DEDUP_SIMILARITY = float(os.getenv("DEDUP_SIMILARITY", "0.95"))  # cosine at or above which chunks count as repeats
+CHARS_PER_TOKEN = 4  # rough estimate for code; only used to stay within the budget
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def _normalized(vectors) -> np.ndarray:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    return matrix / np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+
+
+class DedupStats:
+    """Near-duplicate chunks collapsed before prompting, by prompt kind.
+
+    `collapsed_tokens` counts every repeat taken out of the candidate set; `tokens_saved`
+    only counts repeats the prompt would otherwise have contained (among the leading
+    `limit` ranked chunks of a Q&A prompt), i.e. prompt space spent on distinct chunks
+    instead. Summary selection picks from the whole PR under a
+    budget, so what it would have sent without collapsing is unknown and not claimed.
+    """
+
+    def __init__(self):
+        self.chunks = Counter()
+        self.collapsed_tokens = Counter()
+        self.tokens_saved = Counter()
+
+    def record(self, kind: str, chunks: int, collapsed_tokens: int, tokens_saved: int = 0):
+        self.chunks[kind] += chunks
+        self.collapsed_tokens[kind] += collapsed_tokens
+        self.tokens_saved[kind] += tokens_saved
+
+    def snapshot(self) -> dict:
+        return {
+            "chunks": dict(self.chunks),
+            "collapsed_tokens": dict(self.collapsed_tokens),
+            "tokens_saved": dict(self.tokens_saved),
+            "total_tokens_saved": sum(self.tokens_saved.values()),
+        }
+
+
+dedup_stats = DedupStats()
+
+
+def duplicate_groups(vectors, threshold: float = DEDUP_SIMILARITY) -> List[List[int]]:
+    """Groups of near-identical rows in input order, each as [representative, *repeats]"""
+    matrix = _normalized(vectors)
+    if len(matrix) == 0:
+        return []
+    similarity = matrix @ matrix.T
+    unassigned = np.ones(len(matrix), dtype=bool)
+    groups = []
+    for i in range(len(matrix)):
+        if not unassigned[i]:
+            continue
+        members = np.flatnonzero(unassigned & (similarity[i] >= threshold))
+        unassigned[members] = False
+        groups.append([i] + [int(j) for j in members if j != i])
+    return groups
+
+
+def collapse_duplicates(pairs: list, vectors, kind: str, limit: Optional[int] = None,
+                        threshold: float = DEDUP_SIMILARITY) -> Tuple[List[int], list]:
+    """Keep one (document, metadata) pair per group of near-identical chunks (mass renames,
+    repeated boilerplate), at most `limit` of them, in input order.
+
+    Returns the kept positions and pairs; a kept chunk that stands for others carries
+    `repeated` (how many) and `repeated_in` (their other files) in a copy of its metadata.
+    With `limit`, `pairs` are taken as ranked: without collapsing, the first `limit` of
+    them would have been sent, so repeats among those count as tokens saved.
+    """
+    groups = duplicate_groups(vectors, threshold) if len(pairs) > 1 else [[i] for i in range(len(pairs))]
+    groups = groups[:limit] if limit is not None else groups
+    kept, out = [], []
+    collapsed = collapsed_tokens = saved = 0
+    for group in groups:
+        document, metadata = pairs[group[0]]
+        if len(group) > 1:
+            files = {pairs[j][1].get("file") for j in group[1:]} - {metadata.get("file"), None}
+            metadata = dict(metadata, repeated=len(group) - 1, repeated_in=sorted(files))
+            collapsed += len(group) - 1
+            for j in group[1:]:
+                tokens = estimate_tokens(pairs[j][0])
+                collapsed_tokens += tokens
+                if limit is not None and j < limit:
+                    saved += tokens
+        kept.append(group[0])
+        out.append((document, metadata))
+    if collapsed:
+        dedup_stats.record(kind, collapsed, collapsed_tokens, saved)
+    return kept, out
+
+
+def get_dedup_stats() -> dict:
+    return dedup_stats.snapshot()
+
+
+def select_covering(vectors, costs: List[int], budget: int) -> List[int]:
+    """Positions of chunks that best cover the whole set within `budget`, in pick order.
+
+    Greedy budgeted facility location: each chunk counts as covered by its most similar
+    picked chunk, and every step picks the chunk with the largest gain in total coverage
+    per token. Near-duplicate chunks add almost nothing once one of them is picked, so
+    the picks spread across the distinct parts of the change instead of its first files.
+    """
+    if not costs:
+        return []
+    matrix = _normalized(np.asarray(vectors, dtype=np.float32).reshape(len(costs), -1))
+    similarity = np.clip(matrix @ matrix.T, 0.0, None)   # (n, n); n is bounded by SUMMARY_SELECTION_MAX_CHUNKS
+    costs = np.asarray(costs, dtype=np.float32)
+    covered = np.zeros(len(matrix), dtype=np.float32)
+    available = costs <= budget
+    picked = []
+    remaining = float(budget)
+    while available.any():
+        # gain[j] = sum_i max(0, sim(i, j) - covered[i])
+        gain = np.clip(similarity - covered[:, None], 0.0, None).sum(axis=0)
+        ratio = np.where(available, gain / costs, -np.inf)
+        best = int(np.argmax(ratio))
+        if gain[best] <= 1e-6:
+            break
+        picked.append(best)
+        covered = np.maximum(covered, similarity[:, best])
+        remaining -= costs[best]
+        available &= costs <= remaining
+        available[best] = False
+    return picked
+
+
+def select_summary_chunks(documents: list, metadatas: list, vectors, budget: int = SUMMARY_TOKEN_BUDGET) -> list:
+    """(document, metadata) pairs representative of a PR within a token budget, in diff order.
+
+    Generated/vendored stubs only compete for the budget when nothing else is left, and
+    near-duplicates are collapsed first so the budget goes to distinct changes.
+    """
+    positions = [i for i, m in enumerate(metadatas) if not m.get("generated")] or list(range(len(documents)))
+    if len(positions) > SUMMARY_SELECTION_MAX_CHUNKS:
+        positions = [positions[i] for i in np.linspace(0, len(positions) - 1, SUMMARY_SELECTION_MAX_CHUNKS).astype(int)]
+    vectors = np.asarray(vectors, dtype=np.float32)[positions]
+    kept, pairs = collapse_duplicates([(documents[i], metadatas[i]) for i in positions], vectors, "summary")
+    costs = [estimate_tokens(document) for document, _ in pairs]
+    picks = select_covering(vectors[kept], costs, budget)
+    return sorted((pairs[i] for i in picks), key=lambda pair: diff_order(pair[1]))
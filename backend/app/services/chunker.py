@@ -0,0 +1,161 @@
+# app/services/chunker.py
+import os
+from typing import Iterable, List, Optional
+
+from .diff_parser import FileDiff, Hunk, ParsedDiff
+
+# Size budget per chunk, in characters (MiniLM truncates at 256 word pieces, ~1,000 chars of code)
+CHUNK_MAX_CHARS = int(os.getenv("CHUNK_MAX_CHARS", "1000"))
+
+LANGUAGE_BY_EXTENSION = {
+    ".py": "python", ".pyi": "python", ".js": "javascript", ".jsx": "javascript", ".mjs": "javascript",
+    ".cjs": "javascript", ".ts": "typescript", ".tsx": "typescript", ".java": "java", ".kt": "kotlin",
+    ".go": "go", ".rs": "rust", ".rb": "ruby", ".php": "php", ".c": "c", ".h": "c", ".cc": "cpp",
+    ".cpp": "cpp", ".hpp": "cpp", ".cs": "csharp", ".swift": "swift", ".scala": "scala", ".sql": "sql",
+    ".sh": "shell", ".bash": "shell", ".css": "css", ".scss": "css", ".html": "html", ".vue": "vue",
+    ".md": "markdown", ".json": "json", ".yml": "yaml", ".yaml": "yaml", ".toml": "toml", ".ini": "ini",
+    ".xml": "xml", ".mako": "mako",
+}
+LANGUAGE_BY_FILENAME = {"Dockerfile": "dockerfile", "Makefile": "make", "requirements.txt": "requirements"}
+
+
+def detect_language(path: str) -> str:
+    name = path.rsplit("/", 1)[-1]
+    if name in LANGUAGE_BY_FILENAME:
+        return LANGUAGE_BY_FILENAME[name]
+    ext = os.path.splitext(name)[1].lower()
+    return LANGUAGE_BY_EXTENSION.get(ext, "text")
+
+
+class DiffChunk:
+    """A self-contained piece of a diff: the file header followed by whole hunks"""
+
+    def __init__(self, text: str, file: FileDiff, hunks: int, old_start: int, new_start: int, new_end: int):
+        self.text = text
+        self.file = file.new_path
+        self.part = 0           # position among the file's chunks, set by chunk_diff
+        self.language = detect_language(file.new_path)
+        self.hunks = hunks
+        self.old_start = old_start
+        self.new_start = new_start
+        self.new_end = new_end
+        self.generated = file.generated
+
+    def metadata(self) -> dict:
+        metadata = {
+            "file": self.file,
+            "part": self.part,
+            "language": self.language,
+            "hunks": self.hunks,
+            "old_start": self.old_start,
+            "new_start": self.new_start,
+            "new_end": self.new_end,
+        }
+        if self.generated:
+            metadata["generated"] = self.generated
+        return metadata
+
+
+def diff_order(metadata: dict) -> tuple:
+    """Sort key putting stored chunks back in diff order.
+
+    Git orders a diff's files by path, and `part` counts chunks within a file, so the
+    key stays valid when only some files of a PR are re-ingested.
+    """
+    return metadata.get("file") or "", metadata.get("part", 0)
+
+
+def _split_hunk(parsed: ParsedDiff, hunk: Hunk, budget: int) -> List[tuple]:
+    """Cut an oversized hunk at line boundaries into (text, old_start, new_start, new_end) pieces.
+
+    Each piece gets a recomputed `@@` header so it still parses as a valid hunk.
+    """
+    pieces = []
+    body, size = [], 0
+    old_line, new_line = hunk.old_start, hunk.new_start
+    piece_old, piece_new = old_line, new_line
+    old_count = new_count = 0
+
+    def flush():
+        header = f"@@ -{piece_old},{old_count} +{piece_new},{new_count} @@ {hunk.section}".rstrip()
+        pieces.append(("\n".join([header] + body), piece_old, piece_new, piece_new + max(new_count, 1) - 1))
+
+    for line in parsed.lines[hunk.body:hunk.end]:
+        if body and size + len(line) + 1 > budget:
+            flush()
+            body, size = [], 0
+            piece_old, piece_new = old_line, new_line
+            old_count = new_count = 0
+        body.append(line)
+        size += len(line) + 1
+        kind = line[:1]
+        if kind == "+":
+            new_line += 1
+            new_count += 1
+        elif kind == "-":
+            old_line += 1
+            old_count += 1
+        elif kind != "\\":
+            old_line += 1
+            new_line += 1
+            old_count += 1
+            new_count += 1
+    if body:
+        flush()
+    return pieces
+
+
+def chunk_diff(parsed: ParsedDiff, max_chars: int = CHUNK_MAX_CHARS,
+               files: Optional[Iterable[FileDiff]] = None) -> List[DiffChunk]:
+    """Pack each file's hunks into chunks of at most `max_chars`, without overlap.
+
+    Chunks never cross file boundaries and only split a hunk when it alone exceeds the
+    budget. Every chunk repeats the short file header, so it reads (and parses) as a
+    standalone diff and carries its file path, language and line range as metadata.
+    """
+    chunks = []
+    for file in (parsed.files if files is None else files):
+        first = len(chunks)
+        header = parsed.file_header_text(file)
+        budget = max(max_chars - len(header) - 1, max_chars // 4)
+
+        if file.generated is not None:
+            note = f"[{file.generated} file: content omitted, +{file.additions} -{file.deletions} lines]"
+            chunks.append(DiffChunk(f"{header}\n{note}", file, 0, 0, 0, 0))
+            continue
+        if not file.hunks:
+            chunks.append(DiffChunk(header, file, 0, 0, 0, 0))
+            continue
+
+        group: List[str] = []
+        group_size = 0
+        group_hunks = 0
+        span: Optional[list] = None   # [old_start, new_start, new_end]
+
+        def flush_group():
+            chunks.append(DiffChunk("\n".join([header] + group), file, group_hunks, span[0], span[1], span[2]))
+
+        for hunk in file.hunks:
+            text = parsed.hunk_text(hunk)
+            if len(text) > budget:
+                if group:
+                    flush_group()
+                    group, group_size, group_hunks, span = [], 0, 0, None
+                for piece, old_start, new_start, new_end in _split_hunk(parsed, hunk, budget):
+                    chunks.append(DiffChunk(f"{header}\n{piece}", file, 1, old_start, new_start, new_end))
+                continue
+            if group and group_size + len(text) + 1 > budget:
+                flush_group()
+                group, group_size, group_hunks, span = [], 0, 0, None
+            group.append(text)
+            group_size += len(text) + 1
+            group_hunks += 1
+            if span is None:
+                span = [hunk.old_start, hunk.new_start, hunk.new_end]
+            else:
+                span[2] = max(span[2], hunk.new_end)
+        if group:
+            flush_group()
+        for part, chunk in enumerate(chunks[first:]):
+            chunk.part = part
+    return chunks
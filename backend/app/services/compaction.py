@@ -0,0 +1,85 @@
+# app/services/compaction.py
+import os
+from typing import Optional, Tuple
+import numpy as np
+
+# PCA projection for the repository history indexes (0 keeps full-dimension vectors)
+HISTORY_PCA_DIMS = int(os.getenv("HISTORY_PCA_DIMS", "0"))
+EMBEDDING_PCA_PATH = os.getenv("EMBEDDING_PCA_PATH", "./embedding_pca.npz")
+# Candidates fetched per requested result before re-ranking on full-precision vectors
+RERANK_OVERSAMPLE = int(os.getenv("RERANK_OVERSAMPLE", "4"))
+
+
+class PcaProjection:
+    """Linear projection onto the top principal components of a sample of embeddings.
+
+    Projected vectors are re-normalised so cosine similarity keeps working; the
+    ranking they give is approximate and is meant to be re-ranked on full vectors.
+    """
+
+    def __init__(self, mean: np.ndarray, components: np.ndarray, explained_variance: float = 0.0):
+        self.mean = mean.astype(np.float32)
+        self.components = components.astype(np.float32)   # (dims, input_dims)
+        self.explained_variance = float(explained_variance)
+
+    @property
+    def dims(self) -> int:
+        return self.components.shape[0]
+
+    @classmethod
+    def fit(cls, sample: np.ndarray, dims: int) -> "PcaProjection":
+        sample = np.asarray(sample, dtype=np.float32)
+        mean = sample.mean(axis=0)
+        _, singular_values, vt = np.linalg.svd(sample - mean, full_matrices=False)
+        variance = singular_values ** 2
+        return cls(mean, vt[:dims], variance[:dims].sum() / variance.sum())
+
+    def project(self, vectors: np.ndarray) -> np.ndarray:
+        projected = (np.asarray(vectors, dtype=np.float32) - self.mean) @ self.components.T
+        return projected / np.clip(np.linalg.norm(projected, axis=-1, keepdims=True), 1e-12, None)
+
+    def save(self, path: str):
+        np.savez(path, mean=self.mean, components=self.components, explained_variance=self.explained_variance)
+
+    @classmethod
+    def load(cls, path: str) -> "PcaProjection":
+        data = np.load(path)
+        return cls(data["mean"], data["components"], float(data["explained_variance"]))
+
+
+def quantize_int8(matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-row int8 quantization; returns (codes, scales) with matrix ≈ codes * scales"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    scales = np.clip(np.abs(matrix).max(axis=1, keepdims=True), 1e-12, None) / 127.0
+    codes = np.clip(np.rint(matrix / scales), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def rerank(query: np.ndarray, candidates: np.ndarray, top_k: int) -> np.ndarray:
+    """Positions of the `top_k` candidates with the highest exact cosine similarity, best first"""
+    query = np.asarray(query, dtype=np.float32).reshape(-1)
+    candidates = np.asarray(candidates, dtype=np.float32)
+    scores = candidates @ query / np.clip(np.linalg.norm(candidates, axis=1) * np.linalg.norm(query), 1e-12, None)
+    return np.argsort(-scores)[:top_k]
+
+
+# Global instance
+history_projection = None
+_projection_checked = False
+
+def get_history_projection() -> Optional[PcaProjection]:
+    """The saved PCA projection for history indexes, or None when compaction is off or not fitted yet"""
+    global history_projection, _projection_checked
+    if not _projection_checked:
+        _projection_checked = True
+        if HISTORY_PCA_DIMS and os.path.exists(EMBEDDING_PCA_PATH):
+            projection = PcaProjection.load(EMBEDDING_PCA_PATH)
+            if projection.dims == HISTORY_PCA_DIMS:
+                history_projection = projection
+                print(f"✅ History indexes store {projection.dims}-dim PCA vectors "
+                      f"({projection.explained_variance:.0%} of variance kept)")
+            else:
+                print(f"⚠️ {EMBEDDING_PCA_PATH} has {projection.dims} dims, HISTORY_PCA_DIMS is {HISTORY_PCA_DIMS}; compaction off")
+        elif HISTORY_PCA_DIMS:
+            print(f"⚠️ HISTORY_PCA_DIMS set but {EMBEDDING_PCA_PATH} is missing; run benchmarks/compaction.py --save")
+    return history_projection
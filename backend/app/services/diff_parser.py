@@ -0,0 +1,289 @@
+# app/services/diff_parser.py
+import re
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple, Union
+
+BINARY_EXTENSIONS = ['.pyc', '.pyo', '.pyd', '.so', '.dll', '.exe', '.bin',
+                     '.jpg', '.jpeg', '.png', '.gif', '.pdf', '.zip', '.tar', '.gz']
+
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@ ?(.*)$")
+
+
+def diff_header_paths(line: str) -> Tuple[str, str]:
+    """Return (old_path, new_path) from a `diff --git a/<old> b/<new>` header"""
+    rest = line[len("diff --git "):]
+    if rest.startswith("a/") and " b/" in rest:
+        old, new = rest[2:].rsplit(" b/", 1)
+        return old, new
+    parts = rest.split()
+    if len(parts) >= 2:
+        return parts[0], parts[1]
+    return rest, rest
+
+
+def _is_binary_path(path: str) -> bool:
+    return any(ext in path.lower() for ext in BINARY_EXTENSIONS)
+
+
+class Hunk:
+    """One `@@` section; `start`/`end` index the owning ParsedDiff's `lines`.
+
+    A headerless hunk (bare `+`/`-` lines with no `@@`) has no line numbers and its
+    body starts at `start` instead of the line after it.
+    """
+
+    __slots__ = ("old_start", "old_count", "new_start", "new_count", "section", "start", "body", "end", "additions", "deletions")
+
+    def __init__(self, old_start: int, old_count: int, new_start: int, new_count: int, section: str, start: int,
+                 has_header: bool = True):
+        self.old_start = old_start
+        self.old_count = old_count
+        self.new_start = new_start
+        self.new_count = new_count
+        self.section = section      # text after the closing @@ (often the enclosing function)
+        self.start = start
+        self.body = start + 1 if has_header else start
+        self.end = self.body
+        self.additions = 0
+        self.deletions = 0
+
+    @property
+    def new_end(self) -> int:
+        return self.new_start + max(self.new_count, 1) - 1
+
+    @property
+    def has_header(self) -> bool:
+        return self.body > self.start
+
+    @property
+    def range_label(self) -> str:
+        return f"-{self.old_start},{self.old_count} +{self.new_start},{self.new_count}"
+
+
+class FileDiff:
+    """One file of a diff: header lines, then hunks"""
+
+    __slots__ = ("old_path", "new_path", "start", "end", "hunks", "additions", "deletions", "is_binary", "is_new", "is_deleted",
+                 "generated", "skipped_bytes")
+
+    def __init__(self, old_path: str, new_path: str, start: int):
+        self.old_path = old_path
+        self.new_path = new_path
+        self.start = start
+        self.end = start + 1
+        self.hunks: List[Hunk] = []
+        self.additions = 0
+        self.deletions = 0
+        self.is_binary = False
+        self.is_new = False
+        self.is_deleted = False
+        self.generated: Optional[str] = None   # why the content was stubbed out (generated, vendored, ...)
+        self.skipped_bytes = 0
+
+    @property
+    def path(self) -> str:
+        return self.old_path if self.is_deleted else self.new_path
+
+
+class ParsedDiff:
+    """Compact file → hunk → line-range view of a unified diff.
+
+    The raw lines of kept files are stored once in `lines`; files and hunks only hold
+    index ranges and counters into it, so consumers can get paths, per-file stats or
+    the text of any file/hunk without re-splitting the diff.
+    """
+
+    def __init__(self):
+        self.lines: List[str] = []
+        self.files: List[FileDiff] = []
+        self.skipped_files: List[str] = []   # binary or filtered out while parsing
+
+    @property
+    def additions(self) -> int:
+        return sum(f.additions for f in self.files)
+
+    @property
+    def deletions(self) -> int:
+        return sum(f.deletions for f in self.files)
+
+    @property
+    def stubbed_files(self) -> List[FileDiff]:
+        return [f for f in self.files if f.generated is not None]
+
+    def stub(self, file: FileDiff, reason: str):
+        """Keep only the header of `file`, recording why and how many diff bytes were dropped"""
+        header_end = file.hunks[0].start if file.hunks else file.end
+        file.skipped_bytes += sum(len(line) + 1 for line in self.lines[header_end:file.end])
+        file.hunks = []
+        file.end = header_end
+        file.generated = reason
+
+    def file_text(self, file: FileDiff) -> str:
+        return "\n".join(self.lines[file.start:file.end])
+
+    def hunk_text(self, hunk: Hunk) -> str:
+        return "\n".join(self.lines[hunk.start:hunk.end])
+
+    def file_header_text(self, file: FileDiff) -> str:
+        end = file.hunks[0].start if file.hunks else file.end
+        return "\n".join(self.lines[file.start:end])
+
+    def hunk_changes(self, hunk: Hunk) -> Iterator[Tuple[str, str]]:
+        """Yield (kind, content) for the added ('+'), removed ('-') and context (' ') lines of a hunk"""
+        for line in self.lines[hunk.body:hunk.end]:
+            kind = line[:1]
+            if kind in ("+", "-", " "):
+                yield kind, line[1:]
+            elif not line:
+                yield " ", ""
+
+    def iter_changes(self, file: Optional[FileDiff] = None) -> Iterator[Tuple[FileDiff, str, str]]:
+        """Yield (file, kind, content) for every line of every hunk, optionally for one file"""
+        for f in ([file] if file is not None else self.files):
+            for hunk in f.hunks:
+                for kind, content in self.hunk_changes(hunk):
+                    yield f, kind, content
+
+
+class DiffParser:
+    """Incremental unified-diff parser: `feed` lines as they stream in, then `finish`.
+
+    Binary files (by extension or a `Binary files ... differ` marker) and files rejected
+    by `keep_file(old_path, new_path)` are dropped as soon as they are recognised, so
+    their content never accumulates in memory. Files for which `stub_file(old_path,
+    new_path)` returns a reason keep their header and line counts but not their hunks.
+
+    Text with no `diff --git` header at all (a bare hunk or a few `+`/`-` lines) parses
+    as one file with empty paths; anything before the first header of a real diff (a
+    patch email preamble) is discarded once that header arrives.
+    """
+
+    def __init__(self, keep_file: Optional[Callable[[str, str], bool]] = None, skip_binary: bool = True,
+                 stub_file: Optional[Callable[[str, str], Optional[str]]] = None):
+        self.keep_file = keep_file
+        self.skip_binary = skip_binary
+        self.stub_file = stub_file
+        self.diff = ParsedDiff()
+        self._file: Optional[FileDiff] = None
+        self._hunk: Optional[Hunk] = None
+        self._skipping = False
+        self._stub_body = False
+        self._headerless = False    # current file and hunk were opened without headers
+        self._old_left = 0
+        self._new_left = 0
+
+    def _drop_current(self):
+        file = self._file
+        self.diff.skipped_files.append(file.path)
+        del self.diff.lines[file.start:]
+        self.diff.files.pop()
+        self._file = None
+        self._hunk = None
+        self._skipping = True
+
+    def _start_headerless(self, line: str):
+        self._file = FileDiff("", "", len(self.diff.lines))
+        self.diff.files.append(self._file)
+        self._headerless = True
+        if not line.startswith("@@"):
+            self._hunk = Hunk(0, 0, 0, 0, "", len(self.diff.lines), has_header=False)
+            self._file.hunks.append(self._hunk)
+
+    def feed(self, line: str):
+        if line.startswith("diff --git "):
+            if self._headerless:
+                # What came before the first real header was a preamble, not a diff
+                del self.diff.lines[:]
+                self.diff.files.pop()
+            self._headerless = False
+            old_path, new_path = diff_header_paths(line)
+            self._hunk = None
+            self._stub_body = False
+            self._old_left = self._new_left = 0
+            if (self.skip_binary and _is_binary_path(new_path)) or (self.keep_file and not self.keep_file(old_path, new_path)):
+                self.diff.skipped_files.append(new_path)
+                self._file = None
+                self._skipping = True
+                return
+            self._skipping = False
+            self._file = FileDiff(old_path, new_path, len(self.diff.lines))
+            self._file.generated = self.stub_file(old_path, new_path) if self.stub_file else None
+            self.diff.files.append(self._file)
+            self.diff.lines.append(line)
+            return
+
+        # Lines belonging to a dropped file
+        if self._skipping:
+            return
+        if self._file is None:
+            if not line:
+                return
+            self._start_headerless(line)
+
+        file = self._file
+        if file.generated is not None and (self._stub_body or line.startswith("@@")):
+            # Stubbed file: count its changes but do not keep them
+            self._stub_body = True
+            file.skipped_bytes += len(line) + 1
+            if line[:1] == "+":
+                file.additions += 1
+            elif line[:1] == "-":
+                file.deletions += 1
+            return
+
+        in_hunk = self._hunk is not None and (self._old_left > 0 or self._new_left > 0)
+        if self._hunk is not None and not self._hunk.has_header:
+            # Headerless hunk: runs until an `@@` header, if one ever comes
+            in_hunk = not (line.startswith("@@") and _HUNK_HEADER.match(line))
+
+        if not in_hunk:
+            match = _HUNK_HEADER.match(line) if line.startswith("@@") else None
+            if match:
+                old_start, old_count, new_start, new_count, section = match.groups()
+                self._hunk = Hunk(int(old_start), int(old_count or 1), int(new_start), int(new_count or 1),
+                                  section.strip(), len(self.diff.lines))
+                self._old_left, self._new_left = self._hunk.old_count, self._hunk.new_count
+                file.hunks.append(self._hunk)
+            elif line.startswith("Binary files") or line.startswith("GIT binary patch"):
+                file.is_binary = True
+                if self.skip_binary:
+                    self._drop_current()
+                    return
+            elif line.startswith("new file mode"):
+                file.is_new = True
+            elif line.startswith("deleted file mode"):
+                file.is_deleted = True
+            elif line.startswith("\\") and self._hunk is not None:
+                self._hunk.end = len(self.diff.lines) + 1
+        else:
+            hunk = self._hunk
+            marker = line[:1]
+            if marker == "+":
+                hunk.additions += 1
+                file.additions += 1
+                self._new_left -= 1
+            elif marker == "-":
+                hunk.deletions += 1
+                file.deletions += 1
+                self._old_left -= 1
+            elif marker == "\\":
+                pass  # "\ No newline at end of file"
+            else:
+                # Context (a blank line is context whose leading space was stripped)
+                self._old_left -= 1
+                self._new_left -= 1
+            hunk.end = len(self.diff.lines) + 1
+
+        self.diff.lines.append(line)
+        file.end = len(self.diff.lines)
+
+    def finish(self) -> ParsedDiff:
+        return self.diff
+
+
+def parse_diff(diff: Union[str, Iterable[str]], keep_file: Optional[Callable[[str, str], bool]] = None,
+               skip_binary: bool = True, stub_file: Optional[Callable[[str, str], Optional[str]]] = None) -> ParsedDiff:
+    """Parse a diff given as text or as an iterable of lines"""
+    parser = DiffParser(keep_file=keep_file, skip_binary=skip_binary, stub_file=stub_file)
+    for line in (diff.split("\n") if isinstance(diff, str) else diff):
+        parser.feed(line)
+    return parser.finish()
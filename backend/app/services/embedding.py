@@ -1,115 +1,321 @@
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from sentence_transformers import SentenceTransformer
-from chromadb import Client
-from chromadb.config import Settings
+import os
+import time
 import numpy as np
+import hashlib
+from typing import Iterable, Optional, Set, Union
+from ..chroma import get_collection, get_history_collection, get_chroma_max_batch_size, list_repo_collections, list_history_collections
+from .diff_parser import ParsedDiff, parse_diff
+from .chunker import chunk_diff
+from .file_classifier import FileClassifier
+from .embedding_cache import get_embedding_cache, content_hash, EMBEDDING_CACHE_ENABLED
+from .embedding_batcher import EmbeddingBatcher, EMBEDDING_BATCH_MAX_SIZE
+from .executors import EmbeddingProcessPool, EMBEDDING_PROCESSES
+from .embedding_backends import load_embedding_model, EMBEDDING_BACKEND
+from .pr_index import get_pr_index, PR_INDEX_ENABLED
+from .retrieval_cache import query_embedding_cache, retrieval_cache, normalize_question
+from .compaction import get_history_projection
+from .chunk_selection import select_summary_chunks, SUMMARY_TOKEN_BUDGET
 
 # ── INITIALIZE ONCE ───────────────────────────────────────────────────────────
-# 1) Text splitter: breaks large diffs into ~1,000-char chunks with some overlap
-text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+# 1) Chunking: diff-aware, see services/chunker.py (whole hunks per chunk, no overlap)
 
-# 2) Local embedding model (fast + free)
+# 2) Local embedding model (fast + free); name and backend also key the embedding cache
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+EMBEDDING_CACHE_KEY = f"{EMBEDDING_MODEL_NAME}@{EMBEDDING_BACKEND}"
 embedding_model = None
 
-# 3) ChromaDB client
-chroma_client = Client(Settings())
-# Create (or get) a collection named "pr-diffs"
-collection = chroma_client.get_or_create_collection("pr-diffs")
+# 3) ChromaDB: one persistent/shared store, see app/chroma.py
 
 def get_embedding_model():
     """Lazy initialization of local embedding model"""
     global embedding_model
     if embedding_model is None:
-        print("Loading sentence-transformers model (first time may take a moment)...")
-        embedding_model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+        print(f"Loading embedding model on the {EMBEDDING_BACKEND} backend (first time may take a moment)...")
+        embedding_model = load_embedding_model(EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND)
         print("✅ Local embedding model loaded successfully!")
     return embedding_model
 
-def _filter_binary_files(diff_text: str) -> str:
-    """Filter out binary files and clean up the diff text"""
-    lines = diff_text.split('\n')
-    filtered_lines = []
-    current_file_is_binary = False
-    
-    for line in lines:
-        # Check for new file
-        if line.startswith('diff --git'):
-            # Check if this is a binary file we should skip
-            binary_extensions = ['.pyc', '.pyo', '.pyd', '.so', '.dll', '.exe', '.bin', 
-                                '.jpg', '.jpeg', '.png', '.gif', '.pdf', '.zip', '.tar', '.gz']
-            current_file_is_binary = any(ext in line for ext in binary_extensions)
-            
-            if not current_file_is_binary:
-                filtered_lines.append(line)
-        
-        # Skip binary file content
-        elif current_file_is_binary:
-            continue
-        
-        # Skip binary file indicators
-        elif 'Binary files' in line and 'differ' in line:
-            continue
-        
-        # Keep text content
+# Global instances
+embedding_pool = None
+embedding_batcher = None
+
+def get_embedding_pool() -> Optional[EmbeddingProcessPool]:
+    """Process pool holding warm copies of the model (None when EMBEDDING_PROCESSES=0)"""
+    global embedding_pool
+    if embedding_pool is None and EMBEDDING_PROCESSES > 0:
+        embedding_pool = EmbeddingProcessPool(EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND, EMBEDDING_PROCESSES)
+    return embedding_pool
+
+def get_embedding_batcher() -> EmbeddingBatcher:
+    """Get or create the batcher every encode call goes through"""
+    global embedding_batcher
+    if embedding_batcher is None:
+        pool = get_embedding_pool()
+        if pool is not None:
+            embedding_batcher = EmbeddingBatcher(
+                dispatch=lambda texts: pool.submit(texts, EMBEDDING_BATCH_MAX_SIZE), max_inflight=pool.processes
+            )
         else:
-            filtered_lines.append(line)
-    
-    return '\n'.join(filtered_lines)
+            embedding_batcher = EmbeddingBatcher(
+                lambda texts: get_embedding_model().encode(texts, batch_size=EMBEDDING_BATCH_MAX_SIZE)
+            )
+    return embedding_batcher
+
+def encode_texts(texts: list):
+    """Embed `texts`, reusing cached vectors for text seen before; returns (vectors, cache_hits)"""
+    batcher = get_embedding_batcher()
+    if not EMBEDDING_CACHE_ENABLED:
+        return batcher.encode(texts), 0
+    return get_embedding_cache().encode(EMBEDDING_CACHE_KEY, texts, batcher.encode)
+
+def encode_query(query: str):
+    """Embed one search query (cached; misses share a model batch with concurrent queries)"""
+    key = normalize_question(query)
+    embedding = query_embedding_cache.get(key)
+    if embedding is None:
+        embedding = get_embedding_batcher().encode([key])
+        query_embedding_cache.put(key, embedding)
+    return embedding
+
+def _chunk_id(pr_number: int, chunk) -> str:
+    # Content-addressed: an unchanged chunk keeps its ID across re-ingests, so replacing a
+    # PR's chunk set only writes what changed and deletes what is gone
+    digest = hashlib.sha1(f"{chunk.file}\0{chunk.text}".encode()).hexdigest()[:20]
+    return f"{pr_number}-{digest}"
+
+def _pr_scope(pr_number: int, files: Optional[Iterable[str]] = None) -> dict:
+    where = {"pr": pr_number}
+    if files is not None:
+        where = {"$and": [where, {"file": {"$in": sorted(set(files))}}]}
+    return where
 
 # ── INGEST FUNCTION ───────────────────────────────────────────────────────────
-def ingest_diff(pr_number: int, diff_text: str):
+def ingest_diff(pr_number: int, repo_full: str, diff: Union[str, Iterable[str], ParsedDiff],
+                only_files: Optional[Set[str]] = None):
     """
-    1) Filter out binary files from the diff.
-    2) Split the remaining diff into chunks.
+    1) Parse the diff, dropping binary files and stubbing generated/vendored ones.
+    2) Pack each file's hunks into chunks (chunker.chunk_diff).
     3) Embed each chunk using local sentence-transformers.
-    4) Upsert into Chroma with metadata = {'pr': pr_number}.
+    4) Swap the PR's chunk set in the repository's Chroma collection, metadata =
+       {'pr', 'ingested_at', 'file', 'part', 'language', 'hunks', 'old_start', 'new_start', 'new_end'}.
+
+    `diff` may be the diff text, an iterable of its lines, or a `ParsedDiff` already
+    built while streaming. With `only_files`, only the chunks of those paths are
+    replaced and every other chunk of the PR is kept, which is how incremental
+    re-reviews avoid re-embedding untouched files.
+
+    The new set is upserted before chunks that are no longer part of it are deleted,
+    so readers never see the PR without chunks mid-swap.
     """
-    # Filter out binary files and clean the diff
-    cleaned_diff = _filter_binary_files(diff_text)
-    
-    if not cleaned_diff.strip():
-        print(f"No meaningful content found for PR #{pr_number} after filtering")
-        return
-    
-    chunks = text_splitter.split_text(cleaned_diff)
-    embeddings_model = get_embedding_model()
-
-    # Generate embeddings using local model (free!)
-    chunk_embeddings = embeddings_model.encode(chunks)
-    
-    # Build the payloads: one document per chunk
+    if isinstance(diff, ParsedDiff):
+        parsed = diff
+    else:
+        classifier = FileClassifier()
+        parsed = parse_diff(diff, stub_file=classifier.classify_path)
+        classifier.stub_generated(parsed)
+
+    files = parsed.files
+    if only_files is not None:
+        files = [f for f in files if f.new_path in only_files or f.old_path in only_files]
+    diff_chunks = chunk_diff(parsed, files=files)
+    collection = get_collection(repo_full)
+    history, projection = get_history_target(repo_full)
+    scope = _pr_scope(pr_number, only_files)
+    targets = [collection, history]
+    if only_files is None or only_files:
+        old_ids = [set(target.get(where=scope, include=[])["ids"]) for target in targets]
+    else:
+        old_ids = [set(), set()]
+    ingested_at = int(time.time())
+
+    # Build the payloads: one document per chunk (identical chunks collapse onto one ID)
     ids = []
     documents = []
     metadata_list = []
-    embeddings_list = []
-    
-    for i, (chunk, embedding) in enumerate(zip(chunks, chunk_embeddings)):
-        chunk_id = f"{pr_number}-{i}"
+    seen = set()
+    for chunk in diff_chunks:
+        chunk_id = _chunk_id(pr_number, chunk)
+        if chunk_id in seen:
+            continue
+        seen.add(chunk_id)
         ids.append(chunk_id)
-        documents.append(chunk)
-        metadata_list.append({"pr": pr_number, "idx": i})
-        embeddings_list.append(embedding.tolist())  # Convert numpy array to list
-
-    # Upsert into ChromaDB
-    collection.upsert(
-        ids=ids,
-        documents=documents,
-        metadatas=metadata_list,
-        embeddings=embeddings_list
-    )
-    
-    print(f"✅ Successfully ingested {len(chunks)} chunks for PR #{pr_number} using local embeddings")
-
-def get_pr_chunks(pr_number: int, top_k: int = 5) -> list:
-    """Retrieve stored chunks for a PR using ChromaDB"""
+        documents.append(chunk.text)
+        metadata_list.append({"pr": pr_number, "ingested_at": ingested_at, **chunk.metadata()})
+
+    cache_hits = 0
+    if ids:
+        # Generate embeddings using local model (free!), skipping chunks embedded before
+        chunk_embeddings, cache_hits = encode_texts(documents)
+        # One bulk conversion per matrix (the store's client wants nested lists); history may be PCA-compacted
+        matrix = np.asarray(chunk_embeddings, dtype=np.float32)
+        target_embeddings = [
+            matrix.tolist(),
+            (projection.project(matrix) if projection is not None else matrix).tolist(),
+        ]
+
+        # Upsert into the live and history collections, in pieces no larger than the store accepts per call
+        step = get_chroma_max_batch_size()
+        for target, embeddings_list in zip(targets, target_embeddings):
+            for start in range(0, len(ids), step):
+                target.upsert(
+                    ids=ids[start:start + step],
+                    documents=documents[start:start + step],
+                    metadatas=metadata_list[start:start + step],
+                    embeddings=embeddings_list[start:start + step]
+                )
+
+    # Then drop what the new set no longer contains
+    stale_ids = []
+    for target, target_old_ids in zip(targets, old_ids):
+        stale = sorted(target_old_ids - seen)
+        if stale:
+            target.delete(ids=stale)
+        if target is collection:
+            stale_ids = stale
+    if only_files is not None:
+        _touch_pr(collection, pr_number, ingested_at)
+    get_pr_index().invalidate(repo_full, pr_number)
+
+    if not ids:
+        print(f"No meaningful content found for PR #{pr_number} after filtering")
+        return
+    scope_label = f"{len({chunk.file for chunk in diff_chunks})} changed file(s)" if only_files is not None else "full diff"
+    print(f"✅ Successfully ingested {len(ids)} chunks for {repo_full}#{pr_number} ({scope_label}) using local embeddings, "
+          f"{cache_hits}/{len(ids)} from cache ({cache_hits / len(ids):.0%} hit rate), {len(stale_ids)} stale removed")
+
+def get_history_target(repo_full: str):
+    """(history collection, PCA projection or None) for a repository"""
+    projection = get_history_projection()
+    return get_history_collection(repo_full, projection.dims if projection is not None else None), projection
+
+HISTORY_BACKFILLED_KEY = "backfilled"   # history collection metadata: set once the backfill into it finished
+
+def _pr_numbers(collection, page_size: int) -> set:
+    numbers, offset = set(), 0
+    while True:
+        page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+        if not page["ids"]:
+            return numbers
+        offset += len(page["ids"])
+        numbers.update(m["pr"] for m in page["metadatas"] if m and "pr" in m)
+
+def backfill_projected_history(page_size: int = 1000) -> int:
+    """Copy full-dimension history into the PCA-projected history indexes.
+
+    Turning HISTORY_PCA_DIMS on switches similar-change searches to new, empty
+    collections; this projects what the old ones hold so earlier PRs stay findable.
+    Copying goes PR by PR and skips every PR the projected index already has chunks
+    for: those were ingested after the switch, and the full-dimension index (which
+    stops receiving new PRs) still holds their replaced chunks. A finished repository
+    is marked in its projected collection's metadata, so this is safe to run, and to
+    interrupt, on every start.
+    """
+    projection = get_history_projection()
+    if projection is None:
+        return 0
+    copied = 0
+    step = get_chroma_max_batch_size()
+    for source in list_history_collections():
+        repo_full = (source.metadata or {}).get("repo")
+        if not repo_full:
+            continue
+        target = get_history_collection(repo_full, projection.dims)
+        if (target.metadata or {}).get(HISTORY_BACKFILLED_KEY):
+            continue
+        missing = sorted(_pr_numbers(source, page_size) - _pr_numbers(target, page_size))
+        if missing:
+            print(f"⚠️ Backfilling {projection.dims}-dim history of {repo_full} for {len(missing)} PR(s); "
+                  f"similar-change results miss them until this finishes")
+        for pr_number in missing:
+            if target.get(where={"pr": pr_number}, limit=1, include=[])["ids"]:
+                continue   # ingested while the backfill ran
+            rows = source.get(where={"pr": pr_number}, include=["documents", "metadatas", "embeddings"])
+            if not rows["ids"]:
+                continue
+            vectors = projection.project(np.asarray(rows["embeddings"], dtype=np.float32)).tolist()
+            for start in range(0, len(rows["ids"]), step):
+                target.upsert(
+                    ids=rows["ids"][start:start + step],
+                    documents=rows["documents"][start:start + step],
+                    metadatas=rows["metadatas"][start:start + step],
+                    embeddings=vectors[start:start + step],
+                )
+            copied += len(rows["ids"])
+        # hnsw:* settings are fixed when the index is created and cannot be passed to modify()
+        metadata = {key: value for key, value in (target.metadata or {}).items() if not key.startswith("hnsw:")}
+        target.modify(metadata={**metadata, HISTORY_BACKFILLED_KEY: True})
+    return copied
+
+def held_vectors(repo_full: str, ids: list, documents: Optional[list] = None) -> list:
+    """Full-precision vectors already stored for chunk `ids`, aligned with them (None where unknown).
+
+    Looks in the repository's live collection by ID, then, for chunks of closed PRs, in
+    the embedding cache by text. Never runs the model, so re-ranking on the query path
+    does not queue behind ingests.
+    """
+    found = {}
+    if ids:
+        results = get_collection(repo_full).get(ids=list(ids), include=["embeddings"])
+        found = {chunk_id: np.asarray(vector, dtype=np.float32) for chunk_id, vector in zip(results["ids"], results["embeddings"])}
+    vectors = [found.get(chunk_id) for chunk_id in ids]
+    if documents is not None and EMBEDDING_CACHE_ENABLED and any(vector is None for vector in vectors):
+        hashes = [content_hash(document) for document in documents]
+        cached = get_embedding_cache().get_many(EMBEDDING_CACHE_KEY, [h for h, v in zip(hashes, vectors) if v is None])
+        vectors = [vector if vector is not None else cached.get(digest) for vector, digest in zip(vectors, hashes)]
+    return vectors
+
+def _touch_pr(collection, pr_number: int, ingested_at: int):
+    """Refresh `ingested_at` on a PR's untouched chunks so TTL GC only reaps inactive PRs"""
+    results = collection.get(where={"$and": [{"pr": pr_number}, {"ingested_at": {"$lt": ingested_at}}]}, include=["metadatas"])
+    if results["ids"]:
+        collection.update(
+            ids=results["ids"],
+            metadatas=[{**metadata, "ingested_at": ingested_at} for metadata in results["metadatas"]],
+        )
+
+def delete_pr_chunks(pr_number: int, repo_full: str) -> int:
+    """Remove every chunk of a PR (on close/merge); returns how many were stored"""
+    collection = get_collection(repo_full)
+    ids = collection.get(where={"pr": pr_number}, include=[])["ids"]
+    if ids:
+        collection.delete(ids=ids)
+    get_pr_index().invalidate(repo_full, pr_number)
+    return len(ids)
+
+def gc_stale_chunks(ttl_seconds: float, keep: Optional[dict] = None) -> int:
+    """Delete chunks of PRs not ingested for `ttl_seconds`, across all repositories.
+
+    `keep` maps a repository's full name to PR numbers that are never reaped (PRs still
+    open), so Q&A keeps working on an open PR however long it sits idle.
+    """
+    cutoff = int(time.time() - ttl_seconds)
+    keep = {repo.lower(): prs for repo, prs in (keep or {}).items()}
+    removed = 0
+    for collection in list_repo_collections():
+        where = {"ingested_at": {"$lt": cutoff}}
+        kept = sorted(keep.get(((collection.metadata or {}).get("repo") or "").lower(), ()))
+        if kept:
+            where = {"$and": [where, {"pr": {"$nin": kept}}]}
+        ids = collection.get(where=where, include=[])["ids"]
+        if ids:
+            collection.delete(ids=ids)
+            removed += len(ids)
+    if removed:
+        get_pr_index().clear()
+    return removed
+
+def get_pr_chunks(pr_number: int, repo_full: str, top_k: int = 5, with_metadata: bool = False) -> list:
+    """Retrieve stored chunks for a PR using ChromaDB (as (document, metadata) pairs with `with_metadata`)"""
     try:
         # Use get() to retrieve all documents for a specific PR
-        results = collection.get(
+        results = get_collection(repo_full).get(
             where={"pr": pr_number},
             limit=top_k
         )
         
         if results and results.get("documents"):
+            if with_metadata:
+                return list(zip(results["documents"], results["metadatas"]))
             return results["documents"]
         return []
         
@@ -117,22 +323,78 @@ def get_pr_chunks(pr_number: int, top_k: int = 5) -> list:
         print(f"Error retrieving PR chunks: {e}")
         return []
 
-def semantic_search_pr(pr_number: int, query: str, top_k: int = 5) -> list:
-    """Perform semantic search within a PR's chunks"""
+def get_pr_files(pr_number: int, repo_full: str) -> list:
+    """Paths of the files a PR's stored chunks belong to"""
     try:
-        embeddings_model = get_embedding_model()
-        query_embedding = embeddings_model.encode([query])
-        
-        results = collection.query(
-            where={"pr": pr_number},
+        if PR_INDEX_ENABLED:
+            entry = get_pr_index().entry(repo_full, pr_number, loader=lambda: _load_pr_vectors(pr_number, repo_full))
+            return sorted({path for path in entry.files if path}) if entry is not None else []
+        results = get_collection(repo_full).get(where={"pr": pr_number}, include=["metadatas"])
+    except Exception as e:
+        print(f"Error retrieving PR files: {e}")
+        return []
+    return sorted({m["file"] for m in results.get("metadatas") or [] if m.get("file")})
+
+def _load_pr_vectors(pr_number: int, repo_full: str):
+    results = get_collection(repo_full).get(where={"pr": pr_number}, include=["documents", "metadatas", "embeddings"])
+    return results["ids"], results["documents"], results["metadatas"], results["embeddings"]
+
+def get_pr_summary_chunks(pr_number: int, repo_full: str, token_budget: int = SUMMARY_TOKEN_BUDGET) -> list:
+    """(document, metadata) pairs that best cover the whole PR within `token_budget`, in diff order"""
+    try:
+        if PR_INDEX_ENABLED:
+            entry = get_pr_index().entry(repo_full, pr_number, loader=lambda: _load_pr_vectors(pr_number, repo_full))
+            if entry is None:
+                return []
+            documents, metadatas, vectors = entry.documents, entry.metadatas, entry.vectors()
+        else:
+            _, documents, metadatas, vectors = _load_pr_vectors(pr_number, repo_full)
+    except Exception as e:
+        print(f"Error retrieving PR chunks: {e}")
+        return []
+    if not documents:
+        return []
+    return select_summary_chunks(documents, metadatas, vectors, token_budget)
+
+def semantic_search_pr(pr_number: int, repo_full: str, query: str, top_k: int = 5, files: Optional[Iterable[str]] = None,
+                       with_metadata: bool = False, with_vectors: bool = False):
+    """Perform semantic search within a PR's chunks, optionally restricted to some files.
+
+    With `with_vectors`, returns (hits, vectors): the stored embeddings of the hits as
+    float32 rows aligned with them, so callers need not encode the chunks again.
+    """
+    try:
+        if PR_INDEX_ENABLED:
+            # Fast path: exact top-k over the PR's embeddings held in memory, with the ranking
+            # cached per PR content version so repeated questions skip encoding and scoring
+            entry = get_pr_index().entry(repo_full, pr_number, loader=lambda: _load_pr_vectors(pr_number, repo_full))
+            if entry is None:
+                return ([], np.zeros((0, 0), dtype=np.float32)) if with_vectors else []
+            key = (repo_full, pr_number, entry.version, normalize_question(query), top_k, tuple(sorted(set(files or ()))))
+            ids = retrieval_cache.get(key)
+            if ids is None:
+                ids = entry.top_k(encode_query(query)[0], top_k, files,
+                                  full_vectors=lambda chunk_ids: held_vectors(repo_full, chunk_ids))
+                retrieval_cache.put(key, ids)
+            hits = entry.rows(ids)
+            hits = hits if with_metadata else [document for document, _ in hits]
+            return (hits, entry.vectors(ids)) if with_vectors else hits
+
+        query_embedding = encode_query(query)
+        results = get_collection(repo_full).query(
+            where=_pr_scope(pr_number, files or None),
             query_embeddings=query_embedding.tolist(),
-            n_results=top_k
+            n_results=top_k,
+            include=["documents", "metadatas", "embeddings"] if with_vectors else ["documents", "metadatas"],
         )
         
-        if results and results.get("documents"):
-            return results["documents"][0] if results["documents"] else []
-        return []
+        documents = results["documents"][0] if results and results.get("documents") else []
+        hits = list(zip(documents, results["metadatas"][0])) if with_metadata and documents else documents
+        if with_vectors:
+            vectors = np.asarray(results["embeddings"][0], dtype=np.float32) if documents else np.zeros((0, 0), dtype=np.float32)
+            return hits, vectors
+        return hits
         
     except Exception as e:
         print(f"Error in semantic search: {e}")
-        return []
+        return ([], np.zeros((0, 0), dtype=np.float32)) if with_vectors else []
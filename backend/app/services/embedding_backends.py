@@ -0,0 +1,109 @@
+# app/services/embedding_backends.py
+import os
+import shutil
+from typing import List
+import numpy as np
+
+# "torch" runs sentence-transformers as-is; "onnx" runs the same model exported to
+# ONNX and int8-quantized, which is several times cheaper on CPU-only hosts
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+EMBEDDING_ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR", "./onnx_models")
+EMBEDDING_ONNX_QUANTIZATION = os.getenv("EMBEDDING_ONNX_QUANTIZATION", "avx2")   # avx2 | avx512 | avx512_vnni | arm64 | none
+EMBEDDING_ONNX_THREADS = int(os.getenv("EMBEDDING_ONNX_THREADS", "0"))             # 0 = onnxruntime default
+EMBEDDING_MAX_SEQ_LENGTH = int(os.getenv("EMBEDDING_MAX_SEQ_LENGTH", "256"))      # all-MiniLM-L6-v2 truncates at 256
+
+
+def _export_quantized(model_name: str, target_dir: str):
+    """Export `model_name` to ONNX and quantize its weights to int8 (dynamic quantization)"""
+    from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import AutoTokenizer
+
+    print(f"Exporting {model_name} to ONNX ({EMBEDDING_ONNX_QUANTIZATION}); this only happens once...")
+    export_dir = target_dir + "-fp32"
+    ORTModelForFeatureExtraction.from_pretrained(model_name, export=True).save_pretrained(export_dir)
+    AutoTokenizer.from_pretrained(model_name).save_pretrained(target_dir)
+
+    if EMBEDDING_ONNX_QUANTIZATION == "none":
+        ORTModelForFeatureExtraction.from_pretrained(export_dir).save_pretrained(target_dir)
+    else:
+        config_factory = getattr(AutoQuantizationConfig, EMBEDDING_ONNX_QUANTIZATION)
+        quantizer = ORTQuantizer.from_pretrained(export_dir)
+        quantizer.quantize(save_dir=target_dir, quantization_config=config_factory(is_static=False, per_channel=False))
+    shutil.rmtree(export_dir, ignore_errors=True)
+
+
+class OnnxEmbeddingModel:
+    """ONNX Runtime stand-in for `SentenceTransformer` with the same `encode` contract.
+
+    Reproduces the all-MiniLM-L6-v2 pipeline (transformer, mean pooling over the
+    attention mask, L2 normalisation). Texts are sorted by length before batching so
+    each batch pads to a similar size, and results are returned in input order.
+    """
+
+    def __init__(self, model_name: str, model_dir: str = EMBEDDING_ONNX_DIR):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        suffix = "int8" if EMBEDDING_ONNX_QUANTIZATION != "none" else "fp32"
+        target_dir = os.path.join(model_dir, f"{model_name.replace('/', '__')}-{suffix}")
+        if not os.path.isdir(target_dir):
+            # Export next to the target and rename, so concurrent worker processes never read a half-written model
+            staging_dir = f"{target_dir}.tmp-{os.getpid()}"
+            _export_quantized(model_name, staging_dir)
+            try:
+                os.rename(staging_dir, target_dir)
+            except OSError:
+                pass  # another process finished first; its copy is identical
+        model_file = next(
+            name for name in sorted(os.listdir(target_dir)) if name.endswith(".onnx")
+        )
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if EMBEDDING_ONNX_THREADS:
+            options.intra_op_num_threads = EMBEDDING_ONNX_THREADS
+        self.session = ort.InferenceSession(
+            os.path.join(target_dir, model_file), options, providers=["CPUExecutionProvider"]
+        )
+        self.tokenizer = AutoTokenizer.from_pretrained(target_dir)
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.model_name = model_name
+        self.dimension = self._encode_batch(["dimension probe"]).shape[-1]
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        tokens = self.tokenizer(
+            texts, padding=True, truncation=True, max_length=EMBEDDING_MAX_SEQ_LENGTH, return_tensors="np"
+        )
+        inputs = {name: tokens[name].astype(np.int64) for name in self.input_names if name in tokens}
+        if "token_type_ids" in self.input_names and "token_type_ids" not in inputs:
+            inputs["token_type_ids"] = np.zeros_like(inputs["input_ids"])
+        hidden = self.session.run(None, inputs)[0]
+        mask = tokens["attention_mask"][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def encode(self, sentences, batch_size: int = 32, **kwargs) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        order = np.argsort([-len(text) for text in texts], kind="stable")
+        vectors = np.empty((len(texts), self.dimension), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            index = order[start:start + batch_size]
+            vectors[index] = self._encode_batch([texts[i] for i in index])
+        return vectors[0] if single else vectors
+
+
+def load_embedding_model(model_name: str, backend: str = EMBEDDING_BACKEND):
+    """Load `model_name` on the configured backend; both expose `.encode(texts, batch_size=...)`"""
+    if backend == "onnx":
+        return OnnxEmbeddingModel(model_name)
+    if backend != "torch":
+        raise ValueError(f"Unknown EMBEDDING_BACKEND '{backend}' (expected 'torch' or 'onnx')")
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
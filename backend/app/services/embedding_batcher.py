@@ -0,0 +1,186 @@
+# app/services/embedding_batcher.py
+import os
+import queue
+import itertools
+import threading
+import time
+import functools
+from concurrent.futures import CancelledError, Future
+from typing import Callable, List, Optional
+import numpy as np
+
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "64"))
+EMBEDDING_BATCH_MAX_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "5"))
+
+
+# Queue priorities: whole requests (queries, small ingests) go before slices of large ones
+_PRIORITY_WHOLE = 0
+_PRIORITY_SLICE = 1
+_PRIORITY_STOP = 2
+
+
+class _Request:
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.future: Future = Future()
+
+
+def _gather(futures: List[Future]) -> Future:
+    """One future for the concatenated rows of `futures`, failing with the first error"""
+    combined: Future = Future()
+    pending = [len(futures)]
+    lock = threading.Lock()
+
+    def on_done(future: Future):
+        with lock:
+            if combined.done():
+                return
+            if future.exception() is not None:
+                combined.set_exception(future.exception())
+                return
+            pending[0] -= 1
+            if pending[0] == 0:
+                combined.set_result(np.concatenate([f.result() for f in futures]))
+
+    for future in futures:
+        future.add_done_callback(on_done)
+    return combined
+
+
+class EmbeddingBatcher:
+    """Coalesces encode calls from concurrent callers into shared model batches.
+
+    Callers (request threads, executor threads) block on `encode`; one
+    background thread takes the first waiting request, keeps collecting others for
+    up to `max_wait_ms` or until `max_batch_size` texts are gathered, encodes them
+    in a single call and hands each caller its own rows. A request larger than the
+    batch size is split into batch-sized slices that queue behind whole requests, so
+    a large ingest yields to a Q&A query between slices instead of blocking it
+    until every chunk is encoded.
+
+    With `dispatch` (texts -> Future, e.g. a process pool), up to `max_inflight`
+    batches are encoded at once; while all slots are busy, requests keep queueing
+    and form larger batches.
+    """
+
+    def __init__(self, encode_fn: Optional[Callable[[List[str]], np.ndarray]] = None,
+                 max_batch_size: int = EMBEDDING_BATCH_MAX_SIZE, max_wait_ms: float = EMBEDDING_BATCH_MAX_WAIT_MS,
+                 dispatch: Optional[Callable[[List[str]], Future]] = None, max_inflight: int = 1):
+        self.encode_fn = encode_fn
+        self.dispatch = dispatch
+        self._slots = threading.BoundedSemaphore(max(max_inflight, 1))
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.batches = 0
+        self.requests = 0
+        self.texts = 0
+        self._queue: "queue.PriorityQueue" = queue.PriorityQueue()   # (priority, seq, request or None)
+        self._seq = itertools.count()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._thread.start()
+
+    def _put(self, priority: int, request: Optional[_Request]):
+        self._queue.put((priority, next(self._seq), request))
+
+    def submit(self, texts: List[str]) -> Future:
+        texts = list(texts)
+        if not texts:
+            future: Future = Future()
+            future.set_result(np.zeros((0, 0), dtype=np.float32))
+            return future
+        self._ensure_started()
+        if len(texts) <= self.max_batch_size:
+            request = _Request(texts)
+            self._put(_PRIORITY_WHOLE, request)
+            return request.future
+        slices = [_Request(texts[i:i + self.max_batch_size]) for i in range(0, len(texts), self.max_batch_size)]
+        for request in slices:
+            self._put(_PRIORITY_SLICE, request)
+        return _gather([request.future for request in slices])
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Embed `texts`, sharing the model call with whatever else is waiting"""
+        return self.submit(texts).result()
+
+    def _collect(self, first: _Request) -> List[_Request]:
+        batch, size = [first], len(first.texts)
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            request = item[2]
+            if request is None or size + len(request.texts) > self.max_batch_size:
+                self._queue.put(item)  # stop signal for the run loop, or a slice for the next batch
+                break
+            batch.append(request)
+            size += len(request.texts)
+        return batch
+
+    def _run(self):
+        while True:
+            # Wait for a free slot first, so a query queued meanwhile is taken before a slice
+            self._slots.acquire()
+            _, _, first = self._queue.get()
+            if first is None:
+                self._slots.release()
+                return
+            batch = self._collect(first)
+            texts = [text for request in batch for text in request.texts]
+            if self.dispatch is not None:
+                try:
+                    future = self.dispatch(texts)
+                except Exception as e:
+                    self._deliver(batch, None, e)
+                    continue
+                future.add_done_callback(functools.partial(self._on_done, batch))
+                continue
+            try:
+                vectors = np.asarray(self.encode_fn(texts))
+            except Exception as e:
+                self._deliver(batch, None, e)
+                continue
+            self._deliver(batch, vectors)
+
+    def _on_done(self, batch: List[_Request], future: Future):
+        error = CancelledError("embedding pool shut down") if future.cancelled() else future.exception()
+        self._deliver(batch, None if error else np.asarray(future.result()), error)
+
+    def _deliver(self, batch: List[_Request], vectors: Optional[np.ndarray], error: Optional[BaseException] = None):
+        self._slots.release()
+        if error is not None:
+            for request in batch:
+                request.future.set_exception(error)
+            return
+        self.batches += 1
+        self.requests += len(batch)
+        self.texts += len(vectors)
+        offset = 0
+        for request in batch:
+            request.future.set_result(vectors[offset:offset + len(request.texts)])
+            offset += len(request.texts)
+
+    def close(self):
+        """Stop the batching thread once queued requests are served"""
+        if self._thread is not None and self._thread.is_alive():
+            self._put(_PRIORITY_STOP, None)
+            self._thread.join(timeout=5)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "texts": self.texts,
+            "avg_requests_per_batch": self.requests / self.batches if self.batches else 0.0,
+            "avg_batch_size": self.texts / self.batches if self.batches else 0.0,
+        }
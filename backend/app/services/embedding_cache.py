@@ -0,0 +1,137 @@
+# app/services/embedding_cache.py
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Callable, Dict, List, Sequence, Tuple
+import numpy as np
+
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./embedding_cache.db")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))  # ~300 MB at 384 float32 dims
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+
+_SQLITE_MAX_VARS = 500   # stay well under SQLite's bound-parameter limit
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _batches(items: Sequence, size: int = _SQLITE_MAX_VARS):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class EmbeddingCache:
+    """Persistent embedding store keyed by (model name, sha256 of the text).
+
+    A rebased PR or a backport produces byte-identical chunks, so their vectors can be
+    reused instead of re-encoded. Vectors are stored as float32 blobs in SQLite and the
+    least recently used rows are evicted once the table grows past `max_entries`.
+    """
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL, hash TEXT NOT NULL, dim INTEGER NOT NULL, vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL, PRIMARY KEY (model, hash))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get_many(self, model: str, hashes: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Cached vectors for `hashes` (missing ones are simply absent), marking them as used"""
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        now = time.time()
+        with self._lock:
+            for batch in _batches(unique):
+                marks = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({marks})", [model, *batch]
+                ).fetchall()
+                for digest, blob in rows:
+                    found[digest] = np.frombuffer(blob, dtype=np.float32)
+                if rows:
+                    self._conn.execute(
+                        f"UPDATE embeddings SET last_used = ? WHERE model = ? AND hash IN ({','.join('?' * len(rows))})",
+                        [now, model, *(digest for digest, _ in rows)],
+                    )
+            self._conn.commit()
+        return found
+
+    def put_many(self, model: str, vectors: Dict[str, np.ndarray]):
+        if not vectors:
+            return
+        now = time.time()
+        rows = [
+            (model, digest, int(vector.shape[-1]), np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for digest, vector in vectors.items()
+        ]
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany("INSERT OR IGNORE INTO embeddings VALUES (?, ?, ?, ?, ?)", rows)
+            self._count += self._conn.total_changes - before
+            if self._count > self.max_entries:
+                excess = self._count - self.max_entries
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (excess,),
+                )
+                self._count -= excess
+                self.evictions += excess
+            self._conn.commit()
+
+    def encode(self, model: str, texts: List[str], encode_fn: Callable[[List[str]], np.ndarray]) -> Tuple[np.ndarray, int]:
+        """Vectors for `texts`, calling `encode_fn` only on texts not cached yet; returns (vectors, hits)"""
+        hashes = [content_hash(text) for text in texts]
+        cached = self.get_many(model, hashes)
+
+        missing = {}
+        for digest, text in zip(hashes, texts):
+            if digest not in cached and digest not in missing:
+                missing[digest] = text
+        if missing:
+            fresh = np.asarray(encode_fn(list(missing.values())), dtype=np.float32)
+            new_vectors = dict(zip(missing.keys(), fresh))
+            self.put_many(model, new_vectors)
+            cached.update(new_vectors)
+
+        hits = sum(1 for digest in hashes if digest not in missing)
+        self.hits += hits
+        self.misses += len(hashes) - hits
+        return np.stack([cached[digest] for digest in hashes]), hits
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": self._count,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+# Global instance
+embedding_cache = None
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Get or create the shared embedding cache"""
+    global embedding_cache
+    if embedding_cache is None:
+        embedding_cache = EmbeddingCache()
+        print(f"✅ Embedding cache opened at {embedding_cache.path} ({embedding_cache._count} vectors)")
+    return embedding_cache
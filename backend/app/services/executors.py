@@ -0,0 +1,99 @@
+# app/services/executors.py
+import os
+import asyncio
+import functools
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional
+
+# Pool sizes
+EMBEDDING_PROCESSES = int(os.getenv("EMBEDDING_PROCESSES", "1"))   # 0 encodes in the API process instead
+IO_THREADS = int(os.getenv("IO_THREADS", "16"))                    # DB, Chroma and other blocking calls
+LLM_THREADS = int(os.getenv("LLM_THREADS", "2"))                   # concurrent Ollama requests
+LLM_MAP_THREADS = int(os.getenv("LLM_MAP_THREADS", "4"))           # per-file summary calls of map-reduce reviews, across all reviews
+
+# ── Embedding worker processes ────────────────────────────────────────────────
+# Each process loads the model once in its initializer and keeps it for its lifetime,
+# so encoding never holds the API process's GIL.
+_worker_model = None
+
+
+def _init_embedding_worker(model_name: str, backend: str):
+    global _worker_model
+    from .embedding_backends import load_embedding_model
+    _worker_model = load_embedding_model(model_name, backend)
+    print(f"✅ Embedding worker {os.getpid()} loaded {model_name} ({backend})")
+
+
+def _encode_in_worker(texts: List[str], batch_size: int):
+    return _worker_model.encode(texts, batch_size=batch_size)
+
+
+def _ping_worker() -> int:
+    return os.getpid()
+
+
+class EmbeddingProcessPool:
+    """Warm pool of processes that each hold a loaded embedding model"""
+
+    def __init__(self, model_name: str, backend: str, processes: int = EMBEDDING_PROCESSES):
+        self.model_name = model_name
+        self.backend = backend
+        self.processes = processes
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.processes,
+                # spawn: forking a process that already runs threads (uvicorn, torch) is unsafe
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_embedding_worker,
+                initargs=(self.model_name, self.backend),
+            )
+        return self._executor
+
+    def warm_up(self):
+        """Start the processes now so the first review does not pay for model loading"""
+        executor = self._get_executor()
+        for _ in range(self.processes):
+            executor.submit(_ping_worker)
+
+    def submit(self, texts: List[str], batch_size: int) -> Future:
+        try:
+            return self._get_executor().submit(_encode_in_worker, texts, batch_size)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM-killed); replace the pool and retry once
+            print("⚠️ Embedding process pool broke; restarting it")
+            self._executor = None
+            return self._get_executor().submit(_encode_in_worker, texts, batch_size)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# ── Thread pools ──────────────────────────────────────────────────────────────
+io_executor = ThreadPoolExecutor(max_workers=IO_THREADS, thread_name_prefix="io")
+llm_executor = ThreadPoolExecutor(max_workers=LLM_THREADS, thread_name_prefix="llm")
+# Separate from llm_executor: map calls are submitted from a review already running there,
+# and waiting on the same bounded pool could deadlock it
+llm_map_executor = ThreadPoolExecutor(max_workers=LLM_MAP_THREADS, thread_name_prefix="llm-map")
+
+
+async def run_io(fn, *args, **kwargs):
+    """Run a blocking I/O call (DB session, Chroma, ...) without stalling the event loop"""
+    return await asyncio.get_running_loop().run_in_executor(io_executor, functools.partial(fn, *args, **kwargs))
+
+
+async def run_llm(fn, *args, **kwargs):
+    """Run a blocking LLM call; LLM_THREADS bounds how many hit Ollama at once"""
+    return await asyncio.get_running_loop().run_in_executor(llm_executor, functools.partial(fn, *args, **kwargs))
+
+
+def shutdown_executors():
+    io_executor.shutdown(wait=False, cancel_futures=True)
+    llm_executor.shutdown(wait=False, cancel_futures=True)
+    llm_map_executor.shutdown(wait=False, cancel_futures=True)
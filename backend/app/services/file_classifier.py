@@ -0,0 +1,173 @@
+# app/services/file_classifier.py
+import os
+import math
+import fnmatch
+from collections import Counter
+from typing import List, Optional, Tuple
+
+from .diff_parser import FileDiff, ParsedDiff
+
+# Content heuristics for files the path rules do not catch
+GENERATED_MAX_LINE_LENGTH = int(os.getenv("GENERATED_MAX_LINE_LENGTH", "1000"))   # one added line this long => minified
+GENERATED_MIN_ENTROPY_CHARS = int(os.getenv("GENERATED_MIN_ENTROPY_CHARS", "2000"))
+GENERATED_MAX_ENTROPY = float(os.getenv("GENERATED_MAX_ENTROPY", "5.5"))          # bits/char; source code sits around 4-5
+GENERATED_MARKERS = ("@generated", "do not edit", "auto-generated", "autogenerated", "code generated by")
+
+# Defaults, in .gitattributes syntax so the repo's own file and per-repo overrides can undo them;
+# directory rules start with **/ so they also match inside frontend/ or monorepo packages
+DEFAULT_RULES = """
+package-lock.json linguist-generated
+npm-shrinkwrap.json linguist-generated
+yarn.lock linguist-generated
+pnpm-lock.yaml linguist-generated
+poetry.lock linguist-generated
+Pipfile.lock linguist-generated
+Cargo.lock linguist-generated
+Gemfile.lock linguist-generated
+composer.lock linguist-generated
+go.sum linguist-generated
+*.min.js linguist-generated
+*.min.css linguist-generated
+*.map linguist-generated
+*.snap linguist-generated
+**/__snapshots__/** linguist-generated
+*_pb2.py linguist-generated
+*_pb2_grpc.py linguist-generated
+*.pb.go linguist-generated
+*.pb.cc linguist-generated
+*.pb.h linguist-generated
+*.generated.* linguist-generated
+**/dist/** linguist-generated
+**/build/** linguist-generated
+**/node_modules/** linguist-vendored
+**/vendor/** linguist-vendored
+**/third_party/** linguist-vendored
+"""
+
+_ATTRIBUTES = {"linguist-generated": "generated", "linguist-vendored": "vendored"}
+
+
+def parse_gitattributes(text: str) -> List[Tuple[str, dict]]:
+    """(pattern, {reason: bool}) for every .gitattributes line that sets a linguist attribute"""
+    rules = []
+    for raw in (text or "").splitlines():
+        line = raw.strip()
+        if not line or line.startswith("#"):
+            continue
+        pattern, *attrs = line.split()
+        values = {}
+        for attr in attrs:
+            if attr.startswith("-"):
+                name, value = attr[1:], False
+            elif attr.startswith("!"):
+                continue
+            elif "=" in attr:
+                name, setting = attr.split("=", 1)
+                value = setting.lower() not in ("false", "0")
+            else:
+                name, value = attr, True
+            if name in _ATTRIBUTES:
+                values[_ATTRIBUTES[name]] = value
+        if values:
+            rules.append((pattern, values))
+    return rules
+
+
+def _matches(pattern: str, path: str) -> bool:
+    # gitattributes: a pattern without a slash matches the file name at any depth,
+    # otherwise it is anchored at the repository root
+    if pattern.endswith("/"):
+        pattern += "**"
+    if "/" not in pattern:
+        return fnmatch.fnmatchcase(path.rsplit("/", 1)[-1], pattern)
+    pattern = pattern.lstrip("/")
+    if pattern.startswith("**/"):
+        return fnmatch.fnmatchcase(path, pattern) or fnmatch.fnmatchcase(path, pattern[3:])
+    return fnmatch.fnmatchcase(path, pattern)
+
+
+def _entropy(text: str) -> float:
+    counts = Counter(text)
+    total = len(text)
+    return -sum(n / total * math.log2(n / total) for n in counts.values())
+
+
+class SkipStats:
+    """Files and diff bytes left out of embedding, by reason"""
+
+    def __init__(self):
+        self.files = Counter()
+        self.bytes = Counter()
+
+    def record(self, reason: str, size: int):
+        self.files[reason] += 1
+        self.bytes[reason] += size
+
+    def snapshot(self) -> dict:
+        return {
+            "files": dict(self.files),
+            "bytes": dict(self.bytes),
+            "total_files": sum(self.files.values()),
+            "total_bytes": sum(self.bytes.values()),
+        }
+
+
+stats = SkipStats()
+
+
+class FileClassifier:
+    """Decides which diff files are generated or vendored and should only be stubbed.
+
+    Rules come from DEFAULT_RULES, then the repository's root `.gitattributes`, then the
+    per-repo overrides stored on the Repository row; as in git, the last matching line
+    wins. Files no rule marks are checked for generator banners, minified lines and
+    unusually high character entropy (inlined data, hashes).
+    """
+
+    def __init__(self, gitattributes: str = "", overrides: str = ""):
+        self.rules = parse_gitattributes(DEFAULT_RULES) + parse_gitattributes(gitattributes) + parse_gitattributes(overrides)
+        self.stubbed_files = 0
+        self.skipped_bytes = 0
+
+    def classify_path(self, old_path: str, new_path: str) -> Optional[str]:
+        """'generated', 'vendored' or None, from the path rules alone"""
+        verdict = {}
+        for pattern, values in self.rules:
+            if _matches(pattern, new_path):
+                verdict.update(values)
+        for reason in ("generated", "vendored"):
+            if verdict.get(reason):
+                return reason
+        return None
+
+    def classify_content(self, parsed: ParsedDiff, file: FileDiff) -> Optional[str]:
+        """Heuristic verdict from the file's added lines"""
+        added = [content for _, kind, content in parsed.iter_changes(file) if kind == "+"]
+        if not added:
+            return None
+        head = "\n".join(added[:5]).lower()
+        if any(marker in head for marker in GENERATED_MARKERS):
+            return "generated"
+        if max(len(line) for line in added) > GENERATED_MAX_LINE_LENGTH:
+            return "minified"
+        text = "".join(added)
+        if len(text) >= GENERATED_MIN_ENTROPY_CHARS and _entropy(text[:65536]) > GENERATED_MAX_ENTROPY:
+            return "high-entropy"
+        return None
+
+    def stub_generated(self, parsed: ParsedDiff) -> int:
+        """Stub files the content heuristics flag and tally every stubbed file; returns the count"""
+        for file in parsed.files:
+            if file.generated is None:
+                reason = self.classify_content(parsed, file)
+                if reason:
+                    parsed.stub(file, reason)
+            if file.generated is not None:
+                self.stubbed_files += 1
+                self.skipped_bytes += file.skipped_bytes
+                stats.record(file.generated, file.skipped_bytes)
+        return self.stubbed_files
+
+
+def get_skip_stats() -> dict:
+    return stats.snapshot()
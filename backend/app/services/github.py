@@ -2,7 +2,12 @@
 from dotenv import load_dotenv
 load_dotenv()
 
-import os, requests
+import os
+import httpx
+from typing import AsyncIterator, Optional
+from .rate_limit import scheduled_request, scheduled_stream, PRIORITY_REVIEW
+from .http_cache import cached_get
+from .diff_parser import DiffParser, ParsedDiff
 
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
 HEADERS_DIFF = {
@@ -14,24 +19,112 @@ HEADERS_COMMENT = {
     "Accept": "application/vnd.github.v3+json",
 }
 
-def fetch_diff(diff_url: str) -> str:
-    """Fetch diff content from GitHub API with error handling."""
+# Caps for streamed diffs; anything past them is dropped and the review notes it
+DIFF_MAX_BYTES = int(os.getenv("DIFF_MAX_BYTES", str(20 * 1024 * 1024)))
+DIFF_MAX_FILES = int(os.getenv("DIFF_MAX_FILES", "500"))
+DIFF_MAX_LINES = int(os.getenv("DIFF_MAX_LINES", "200000"))
+
+
+class DiffCaps:
+    """Byte / file / line limits for one diff download, recording whether one was hit"""
+
+    def __init__(self, max_bytes: int = DIFF_MAX_BYTES, max_files: int = DIFF_MAX_FILES, max_lines: int = DIFF_MAX_LINES):
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.max_lines = max_lines
+        self.bytes = 0
+        self.files = 0
+        self.lines = 0
+        self.truncated: Optional[str] = None
+
+    def admit(self, line: str) -> bool:
+        """Count `line` against the caps; False once a cap is reached"""
+        if line.startswith("diff --git "):
+            if self.files >= self.max_files:
+                self.truncated = f"stopped after {self.files} files (DIFF_MAX_FILES)"
+                return False
+            self.files += 1
+        self.bytes += len(line.encode("utf-8", "ignore")) + 1
+        self.lines += 1
+        if self.bytes > self.max_bytes:
+            self.truncated = f"stopped after {self.max_bytes // 1024} KiB in {self.files} files (DIFF_MAX_BYTES)"
+            return False
+        if self.lines > self.max_lines:
+            self.truncated = f"stopped after {self.max_lines} lines in {self.files} files (DIFF_MAX_LINES)"
+            return False
+        return True
+
+async def fetch_diff(diff_url: str) -> str:
+    """Fetch diff content from GitHub API.
+
+    Errors are raised rather than turned into an empty diff, so the review queue
+    retries the job instead of summarizing nothing.
+    """
     try:
-        resp = requests.get(diff_url, headers=HEADERS_DIFF)
+        resp = await scheduled_request("GET", diff_url, HEADERS_DIFF, priority=PRIORITY_REVIEW, follow_redirects=True)
         resp.raise_for_status()
         return resp.text
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"Error fetching diff: {e}")
+        raise
+
+async def stream_diff(diff_url: str, caps: Optional[DiffCaps] = None) -> AsyncIterator[str]:
+    """Yield diff lines as they arrive, closing the download once a cap is hit"""
+    caps = caps or DiffCaps()
+    async with scheduled_stream("GET", diff_url, HEADERS_DIFF, priority=PRIORITY_REVIEW, follow_redirects=True) as resp:
+        resp.raise_for_status()
+        async for line in resp.aiter_lines():
+            line = line.rstrip("\r\n")
+            if not caps.admit(line):
+                print(f"✂️ Diff truncated: {caps.truncated}")
+                break
+            yield line
+
+async def fetch_compare_diff(repo_full: str, base_sha: str, head_sha: str, parser: DiffParser,
+                             caps: Optional[DiffCaps] = None) -> Optional[ParsedDiff]:
+    """The diff between two commits, parsed with `parser` while it streams in.
+
+    Returns None when the compare is unavailable (e.g. the base was force-pushed away),
+    touches no files, or is too large to be worth an incremental review.
+    """
+    url = f"https://api.github.com/repos/{repo_full}/compare/{base_sha}...{head_sha}"
+    caps = caps or DiffCaps()
+    try:
+        async for line in stream_diff(url, caps):
+            parser.feed(line)
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code in (404, 422):
+            print(f"Compare {base_sha[:7]}...{head_sha[:7]} unavailable for {repo_full}; doing a full review")
+            return None
+        raise
+    if caps.truncated:
+        return None
+    parsed = parser.finish()
+    return parsed if parsed.files or parsed.skipped_files else None
+
+async def fetch_gitattributes(repo_full: str, ref: Optional[str]) -> str:
+    """Root `.gitattributes` of the repo at `ref`, or "" if it has none"""
+    url = f"https://api.github.com/repos/{repo_full}/contents/.gitattributes"
+    if ref:
+        url += f"?ref={ref}"
+    headers = {**HEADERS_COMMENT, "Accept": "application/vnd.github.raw"}
+    try:
+        resp = await cached_get(url, headers, priority=PRIORITY_REVIEW)
+    except httpx.HTTPError as e:
+        print(f"Could not fetch .gitattributes for {repo_full}: {e}")
+        return ""
+    if resp.status_code != 200:
         return ""
+    return resp.text
 
-def post_comment(pr_number: int, repo_full: str, body: str):
+async def post_comment(pr_number: int, repo_full: str, body: str):
     """Post a comment to a GitHub PR with improved error handling."""
     url = f"https://api.github.com/repos/{repo_full}/issues/{pr_number}/comments"
     try:
-        resp = requests.post(url, json={"body": body}, headers=HEADERS_COMMENT)
+        resp = await scheduled_request("POST", url, HEADERS_COMMENT, priority=PRIORITY_REVIEW, json={"body": body})
         resp.raise_for_status()
         print(f"✅ Successfully posted comment to PR #{pr_number}")
         return resp.json()
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"❌ Error posting comment to PR #{pr_number}: {e}")
         raise
@@ -0,0 +1,88 @@
+# app/services/http.py
+import os
+import httpx
+
+# Pool / timeout configuration for the shared GitHub client
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "50"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+
+try:
+    import h2  # noqa: F401  (httpx needs it for HTTP/2)
+    _h2_available = True
+except ImportError:
+    _h2_available = False
+
+
+class ConnectionMetrics:
+    """Counts requests against new connections so keep-alive reuse is observable"""
+
+    def __init__(self):
+        self.requests = 0
+        self.new_connections = 0
+        self.tls_handshakes = 0
+        self.http2_requests = 0
+
+    def snapshot(self) -> dict:
+        reused = max(self.requests - self.new_connections, 0)
+        return {
+            "requests": self.requests,
+            "new_connections": self.new_connections,
+            "reused_connections": reused,
+            "reuse_ratio": reused / self.requests if self.requests else 0.0,
+            "tls_handshakes": self.tls_handshakes,
+            "http2_requests": self.http2_requests,
+        }
+
+
+metrics = ConnectionMetrics()
+
+
+async def _trace(event_name: str, info: dict):
+    # httpcore reports connection lifecycle events through the "trace" extension
+    if event_name == "connection.connect_tcp.complete":
+        metrics.new_connections += 1
+    elif event_name == "connection.start_tls.complete":
+        metrics.tls_handshakes += 1
+    elif event_name == "http2.send_request_headers.started":
+        metrics.http2_requests += 1
+
+
+async def _on_request(request: httpx.Request):
+    metrics.requests += 1
+    request.extensions["trace"] = _trace
+
+
+# Global instance
+http_client = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """Get or create the application-wide GitHub HTTP client"""
+    global http_client
+    if http_client is None or http_client.is_closed:
+        http_client = httpx.AsyncClient(
+            http2=HTTP2_ENABLED and _h2_available,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            event_hooks={"request": [_on_request]},
+        )
+        if HTTP2_ENABLED and not _h2_available:
+            print("⚠️ HTTP/2 requested but the 'h2' package is missing; using HTTP/1.1")
+    return http_client
+
+async def close_http_client():
+    """Close the shared client (called on application shutdown)"""
+    global http_client
+    if http_client is not None:
+        await http_client.aclose()
+        http_client = None
+
+def get_http_metrics() -> dict:
+    return metrics.snapshot()
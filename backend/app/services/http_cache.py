@@ -0,0 +1,99 @@
+# app/services/http_cache.py
+import os
+import hashlib
+from typing import Optional
+import httpx
+
+from .lru import LRUCache
+from .rate_limit import scheduled_request, PRIORITY_REVIEW
+
+HTTP_CACHE_MAX_ENTRIES = int(os.getenv("HTTP_CACHE_MAX_ENTRIES", "2000"))
+HTTP_CACHE_MAX_BYTES = int(os.getenv("HTTP_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Headers worth replaying from a cached response (pagination relies on Link)
+_KEPT_HEADERS = ("content-type", "link", "etag", "last-modified")
+
+
+class _Entry:
+    def __init__(self, etag: Optional[str], last_modified: Optional[str], content: bytes, headers: dict):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.content = content
+        self.headers = headers
+
+
+class ConditionalCache:
+    """Bounded LRU of GitHub GET responses revalidated with ETag / Last-Modified.
+
+    GitHub does not count `304 Not Modified` answers against the rate limit, so a
+    revalidated page costs a round-trip but no quota. Entries are keyed by URL, Accept
+    header and a hash of the Authorization header, since the same URL returns
+    different bodies for different tokens.
+    """
+
+    def __init__(self, max_entries: int = HTTP_CACHE_MAX_ENTRIES, max_bytes: int = HTTP_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = LRUCache(max_entries, max_bytes, sizeof=lambda entry: len(entry.content))
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(url: str, headers: dict) -> tuple:
+        auth = headers.get("Authorization", "")
+        token_hash = hashlib.sha256(auth.encode()).hexdigest()[:16] if auth else ""
+        return (url, headers.get("Accept", ""), token_hash)
+
+    async def get(self, url: str, headers: dict, priority: int = PRIORITY_REVIEW) -> httpx.Response:
+        """GET `url`, sending validators for a cached copy and replaying it on 304"""
+        key = self._key(url, headers)
+        entry = self._entries.peek(key)
+        request_headers = dict(headers)
+        if entry is not None:
+            if entry.etag:
+                request_headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                request_headers["If-Modified-Since"] = entry.last_modified
+
+        response = await scheduled_request("GET", url, request_headers, priority=priority)
+
+        if response.status_code == 304 and entry is not None:
+            self.hits += 1
+            self._entries.touch(key)
+            return httpx.Response(200, headers=entry.headers, content=entry.content, request=response.request)
+
+        self.misses += 1
+        if response.status_code == 200:
+            etag = response.headers.get("etag")
+            last_modified = response.headers.get("last-modified")
+            if etag or last_modified:
+                kept = {name: response.headers[name] for name in _KEPT_HEADERS if name in response.headers}
+                if len(response.content) <= self.max_bytes:
+                    self._entries.put(key, _Entry(etag, last_modified, response.content, kept))
+        else:
+            self._entries.pop(key)
+        return response
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._entries.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self._entries.evictions,
+        }
+
+
+# Global instance
+conditional_cache = None
+
+def get_conditional_cache() -> ConditionalCache:
+    """Get or create the shared conditional-request cache"""
+    global conditional_cache
+    if conditional_cache is None:
+        conditional_cache = ConditionalCache()
+    return conditional_cache
+
+async def cached_get(url: str, headers: dict, priority: int = PRIORITY_REVIEW) -> httpx.Response:
+    return await get_conditional_cache().get(url, headers, priority)
@@ -1,10 +1,11 @@
 import os
 import re
-from typing import List, Dict
+from typing import List, Dict, Optional
 from sentence_transformers import SentenceTransformer
 import numpy as np
 from transformers import pipeline, AutoTokenizer, AutoModelForCausalLM
 import torch
+from .diff_parser import ParsedDiff, parse_diff
 
 class LocalLLMService:
     """Free local LLM service using Hugging Face transformers - no API calls needed"""
@@ -57,84 +58,30 @@ class LocalLLMService:
         if not text or not text.strip():
             return ""
         
-        lines = text.split('\n')
+        parsed = parse_diff(text)
         meaningful_lines = []
-        current_file = None
-        skip_binary = False
         
-        for line in lines:
-            line = line.strip()
+        for file in parsed.files:
+            if file.new_path:  # headerless chunk text has no paths
+                meaningful_lines.append(f"Modified file: {file.new_path}")
+                if not file.is_new:
+                    meaningful_lines.append(f"Original: {file.old_path}")
+                if not file.is_deleted:
+                    meaningful_lines.append(f"Modified: {file.new_path}")
             
-            # Detect file headers
-            if line.startswith('diff --git'):
-                current_file = line
-                # Check if this is a binary file we should skip
-                binary_extensions = ['.pyc', '.pyo', '.pyd', '.so', '.dll', '.exe', '.bin', 
-                                   '.jpg', '.jpeg', '.png', '.gif', '.pdf', '.zip', '.tar', '.gz']
-                skip_binary = any(ext in line.lower() for ext in binary_extensions)
-                
-                if not skip_binary:
-                    # Extract clean file names
-                    try:
-                        parts = line.split()
-                        if len(parts) >= 4:
-                            file_a = parts[2].replace('a/', '')
-                            file_b = parts[3].replace('b/', '')
-                            meaningful_lines.append(f"Modified file: {file_b}")
-                    except:
-                        meaningful_lines.append("File modified")
-                continue
-            
-            # Skip binary files completely
-            if skip_binary:
-                continue
-            
-            # Skip binary file indicators and index lines
-            if any(indicator in line for indicator in ['Binary files', 'differ', 'index ']):
-                continue
-            
-            # Handle file path lines
-            if line.startswith('---') or line.startswith('+++'):
-                if line.startswith('---'):
-                    file_path = line[4:].strip()
-                    if file_path.startswith('a/'):
-                        file_path = file_path[2:]
-                    if file_path != '/dev/null':
-                        meaningful_lines.append(f"Original: {file_path}")
-                elif line.startswith('+++'):
-                    file_path = line[4:].strip()
-                    if file_path.startswith('b/'):
-                        file_path = file_path[2:]
-                    if file_path != '/dev/null':
-                        meaningful_lines.append(f"Modified: {file_path}")
-                continue
-            
-            # Handle hunk headers
-            if line.startswith('@@'):
-                # Extract line numbers
-                try:
-                    hunk_info = line.split('@@')[1].strip()
-                    meaningful_lines.append(f"Changes at: {hunk_info}")
-                except:
-                    meaningful_lines.append("Code section changed")
-                continue
-            
-            # Handle actual code changes
-            if line.startswith('+') and not line.startswith('+++'):
-                # Added line
-                code_line = line[1:].strip()
-                if self._is_readable_code(code_line):
-                    meaningful_lines.append(f"Added: {code_line}")
-            elif line.startswith('-') and not line.startswith('---'):
-                # Removed line
-                code_line = line[1:].strip()
-                if self._is_readable_code(code_line):
-                    meaningful_lines.append(f"Removed: {code_line}")
-            elif line.startswith(' '):
-                # Context line
-                code_line = line[1:].strip()
-                if self._is_readable_code(code_line) and len(meaningful_lines) < 80:
-                    meaningful_lines.append(f"Context: {code_line}")
+            for hunk in file.hunks:
+                if hunk.has_header:
+                    meaningful_lines.append(f"Changes at: {hunk.range_label}")
+                for kind, content in parsed.hunk_changes(hunk):
+                    code_line = content.strip()
+                    if not self._is_readable_code(code_line):
+                        continue
+                    if kind == '+':
+                        meaningful_lines.append(f"Added: {code_line}")
+                    elif kind == '-':
+                        meaningful_lines.append(f"Removed: {code_line}")
+                    elif len(meaningful_lines) < 80:
+                        meaningful_lines.append(f"Context: {code_line}")
         
         return '\n'.join(meaningful_lines[:100])  # Limit to 100 lines
     
@@ -168,47 +115,27 @@ class LocalLLMService:
         
         return True
     
-    def _rule_based_summary(self, chunks: List[str]) -> str:
-        """Generate a detailed summary by parsing actual diff format"""
+    def _rule_based_summary(self, chunks: List[str], parsed: Optional[ParsedDiff] = None) -> str:
+        """Generate a detailed summary from the parsed diff structure"""
         if not chunks:
             return "No changes detected in this pull request."
         
-        # Combine all chunks
-        full_text = '\n'.join(chunks)
-        
-        # Parse the diff properly
+        # Parse the combined chunks once (callers that already parsed pass `parsed`)
+        parsed = parsed or parse_diff('\n'.join(chunks))
         files_changed = {}
-        current_file = None
         
-        for line in full_text.split('\n'):
-            # Track current file from diff header
-            if line.startswith('diff --git'):
-                # Extract file path from "diff --git a/file b/file"
-                parts = line.split()
-                if len(parts) >= 4:
-                    file_path = parts[3]  # b/path/to/file
-                    if file_path.startswith('b/'):
-                        file_path = file_path[2:]
-                    current_file = file_path
-                    if current_file not in files_changed:
-                        files_changed[current_file] = {'added': 0, 'removed': 0, 'changes': []}
-            
-            # Count actual code changes (not headers)
-            elif line.startswith('+') and not line.startswith('+++') and current_file:
-                files_changed[current_file]['added'] += 1
-                # Store actual change content (first 60 chars)
-                change_content = line[1:].strip()
-                if change_content:  # Only non-empty changes
-                    short_content = change_content[:60] + "..." if len(change_content) > 60 else change_content
-                    files_changed[current_file]['changes'].append(f"➕ {short_content}")
+        for file in parsed.files:
+            entry = files_changed.setdefault(file.new_path or "(no file header)", {'added': 0, 'removed': 0, 'changes': []})
+            entry['added'] += file.additions
+            entry['removed'] += file.deletions
             
-            elif line.startswith('-') and not line.startswith('---') and current_file:
-                files_changed[current_file]['removed'] += 1
-                # Store actual change content (first 60 chars)
-                change_content = line[1:].strip()
-                if change_content:  # Only non-empty changes
-                    short_content = change_content[:60] + "..." if len(change_content) > 60 else change_content
-                    files_changed[current_file]['changes'].append(f"➖ {short_content}")
+            # Store actual change content (first 60 chars)
+            for _, kind, content in parsed.iter_changes(file):
+                change_content = content.strip()
+                if kind == ' ' or not change_content:
+                    continue
+                short_content = change_content[:60] + "..." if len(change_content) > 60 else change_content
+                entry['changes'].append(f"➕ {short_content}" if kind == '+' else f"➖ {short_content}")
         
         # Calculate totals
         total_added = sum(f['added'] for f in files_changed.values())
@@ -316,42 +243,30 @@ class LocalLLMService:
             # Use rule-based approach only for reliability
             # ML text generation models hallucinate on code analysis tasks
             
-            # Combine all chunks for analysis
-            full_text = '\n'.join(chunks)
+            # Parse all chunks once; every branch below reads the parsed structure
+            parsed = parse_diff('\n'.join(chunks))
             question_lower = question.lower()
             
             if 'what' in question_lower and 'change' in question_lower:
-                return self._rule_based_summary(chunks)
+                return self._rule_based_summary(chunks, parsed)
             elif 'how many' in question_lower:
-                added = len([line for line in full_text.split('\n') if line.startswith('+') and not line.startswith('+++')])
-                removed = len([line for line in full_text.split('\n') if line.startswith('-') and not line.startswith('---')])
-                return f"**Answer:** This PR contains {added} added lines and {removed} removed lines."
+                return f"**Answer:** This PR contains {parsed.additions} added lines and {parsed.deletions} removed lines."
             elif 'file' in question_lower:
                 files = set()
-                for line in full_text.split('\n'):
-                    if line.startswith('+++') or line.startswith('---'):
-                        parts = line.split()
-                        if len(parts) > 1:
-                            file_path = parts[1]
-                            if file_path.startswith('a/') or file_path.startswith('b/'):
-                                file_path = file_path[2:]
-                            if file_path and file_path != '/dev/null':
-                                files.add(file_path)
+                for file in parsed.files:
+                    if not file.is_new:
+                        files.add(file.old_path)
+                    if not file.is_deleted:
+                        files.add(file.new_path)
                 return f"**Answer:** Files modified: {', '.join(list(files))}"
             elif 'add' in question_lower:
-                added_lines = []
-                for line in full_text.split('\n'):
-                    if line.startswith('+') and not line.startswith('+++'):
-                        added_lines.append(line[1:].strip())
+                added_lines = [content.strip() for _, kind, content in parsed.iter_changes() if kind == '+']
                 if added_lines:
                     return f"**Answer:** Added content includes:\n" + "\n".join(f"- `{line}`" for line in added_lines[:5])
                 else:
                     return f"**Answer:** No lines were added in this PR."
             elif 'remove' in question_lower or 'delete' in question_lower:
-                removed_lines = []
-                for line in full_text.split('\n'):
-                    if line.startswith('-') and not line.startswith('---'):
-                        removed_lines.append(line[1:].strip())
+                removed_lines = [content.strip() for _, kind, content in parsed.iter_changes() if kind == '-']
                 if removed_lines:
                     return f"**Answer:** Removed content includes:\n" + "\n".join(f"- `{line}`" for line in removed_lines[:5])
                 else:
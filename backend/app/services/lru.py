@@ -0,0 +1,84 @@
+# app/services/lru.py
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+
+class LRUCache:
+    """Small thread-safe LRU bounded by entry count and, given `sizeof`, by total bytes.
+
+    `get` counts hits and misses; `peek` and `touch` let callers that decide for
+    themselves what counts as a hit (expiry, revalidation) keep their own counters.
+    The most recent entry is never evicted for size alone.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: Optional[int] = None,
+                 sizeof: Optional[Callable[[object], int]] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _size(self, value) -> int:
+        return self.sizeof(value) if self.sizeof else 0
+
+    def peek(self, key):
+        """The cached value without touching recency or counters"""
+        with self._lock:
+            return self._entries.get(key)
+
+    def touch(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= self._size(old)
+            self._entries[key] = value
+            self.bytes += self._size(value)
+            while len(self._entries) > self.max_entries or (
+                    self.max_bytes is not None and len(self._entries) > 1 and self.bytes > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= self._size(evicted)
+                self.evictions += 1
+
+    def pop(self, key):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= self._size(old)
+            return old
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,182 @@
+# app/services/pr_index.py
+import os
+import time
+import hashlib
+import threading
+from typing import Callable, Iterable, List, Optional, Tuple
+import numpy as np
+
+from .compaction import quantize_int8, rerank, RERANK_OVERSAMPLE
+from .lru import LRUCache
+
+PR_INDEX_ENABLED = os.getenv("PR_INDEX_ENABLED", "true").lower() == "true"
+PR_INDEX_MAX_PRS = int(os.getenv("PR_INDEX_MAX_PRS", "256"))
+PR_INDEX_MAX_BYTES = int(os.getenv("PR_INDEX_MAX_BYTES", str(256 * 1024 * 1024)))
+PR_INDEX_DTYPE = os.getenv("PR_INDEX_DTYPE", "float32")                 # float32 | float16 | int8 (re-ranked on full vectors)
+PR_INDEX_TTL_SECONDS = float(os.getenv("PR_INDEX_TTL_SECONDS", "300"))  # reload so other workers' ingests show up
+
+
+class _PrVectors:
+    """One PR's chunks: rows of `matrix` are unit-length embeddings aligned with ids/documents/metadatas"""
+
+    def __init__(self, ids: list, documents: list, metadatas: list, embeddings, dtype: str):
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        matrix = np.array(embeddings, dtype=np.float32).reshape(len(ids), -1)
+        matrix /= np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+        self.dtype = dtype
+        self.scales = None
+        if dtype == "int8":
+            codes, self.scales = quantize_int8(matrix)
+            self.matrix = np.ascontiguousarray(codes)
+        else:
+            self.matrix = np.ascontiguousarray(matrix, dtype=dtype)
+        self.files = np.array([m.get("file", "") for m in metadatas], dtype=object)
+        self.positions = {chunk_id: i for i, chunk_id in enumerate(ids)}
+        # Chunk IDs are content hashes, so this changes exactly when the PR is re-ingested with new content
+        self.version = hashlib.sha1("\n".join(sorted(ids)).encode()).hexdigest()[:16]
+        self.loaded_at = time.monotonic()
+
+    @property
+    def nbytes(self) -> int:
+        return self.matrix.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def vectors(self, ids: Optional[Iterable[str]] = None) -> np.ndarray:
+        """The (possibly compacted) matrix as float32 rows, or just the rows of `ids` this version holds"""
+        rows = slice(None) if ids is None else [self.positions[i] for i in ids if i in self.positions]
+        matrix = self.matrix[rows].astype(np.float32)
+        return matrix * self.scales[rows] if self.scales is not None else matrix
+
+    def _scores(self, query: np.ndarray) -> np.ndarray:
+        if self.scales is not None:
+            return (self.matrix.astype(np.float32) @ query) * self.scales[:, 0]
+        return (self.matrix @ query.astype(self.matrix.dtype)).astype(np.float32)
+
+    def top_k(self, query_embedding, k: int, files: Optional[Iterable[str]] = None,
+              full_vectors: Optional[Callable[[List[str]], list]] = None) -> List[str]:
+        """IDs of the `k` chunks most similar to the query, best first.
+
+        On a compacted matrix, `full_vectors(ids)` supplies the stored full-precision
+        vectors (None where missing) to re-rank an oversampled candidate set, so
+        compaction costs memory, not ranking.
+        """
+        query = np.array(query_embedding, dtype=np.float32).reshape(-1)
+        query /= max(float(np.linalg.norm(query)), 1e-12)
+        scores = self._scores(query)
+        if files:
+            scores = np.where(np.isin(self.files, list(files)), scores, -np.inf)
+        compacted = self.dtype != "float32" and full_vectors is not None
+        wanted = min(k * RERANK_OVERSAMPLE if compacted else k, int(np.isfinite(scores).sum()))
+        if wanted <= 0:
+            return []
+        top = np.argpartition(-scores, wanted - 1)[:wanted]
+        top = top[np.argsort(-scores[top])]
+        if compacted:
+            vectors = full_vectors([self.ids[i] for i in top])
+            if all(vector is not None for vector in vectors):
+                top = top[rerank(query, np.stack(vectors), k)]
+        return [self.ids[i] for i in top[:k]]
+
+    def rows(self, ids: Iterable[str]) -> List[Tuple[str, dict]]:
+        """(document, metadata) pairs for `ids`, skipping any this version does not hold"""
+        return [(self.documents[self.positions[i]], self.metadatas[self.positions[i]]) for i in ids if i in self.positions]
+
+
+class PrVectorIndex:
+    """Exact top-k over a PR's chunks with one matrix-vector product.
+
+    A PR has at most a few hundred chunks, so brute force over a contiguous matrix is
+    both exact and faster than a filtered ANN query. Matrices are loaded from the
+    vector store on first use, kept in an LRU bounded by PR count and bytes, dropped
+    when the PR is re-ingested here, and reloaded after `ttl` in case another worker
+    re-ingested it.
+    """
+
+    def __init__(self, max_prs: int = PR_INDEX_MAX_PRS, max_bytes: int = PR_INDEX_MAX_BYTES,
+                 dtype: str = PR_INDEX_DTYPE, ttl: float = PR_INDEX_TTL_SECONDS):
+        self.dtype = dtype
+        self.ttl = ttl
+        self._entries = LRUCache(max_prs, max_bytes, sizeof=lambda entry: entry.nbytes)
+        self._lock = threading.Lock()
+        # Bumped by invalidate/clear; a load that raced one of them is not cached
+        self._generations = {}
+        self._epoch = 0
+        self.hits = 0
+        self.loads = 0
+
+    def _get(self, key: tuple) -> Optional[_PrVectors]:
+        with self._lock:
+            entry = self._entries.peek(key)
+            if entry is None or time.monotonic() - entry.loaded_at > self.ttl:
+                return None
+            self._entries.touch(key)
+            self.hits += 1
+            return entry
+
+    def _generation(self, key: tuple) -> tuple:
+        with self._lock:
+            return self._epoch, self._generations.get(key, 0)
+
+    def _put(self, key: tuple, entry: _PrVectors, generation: tuple):
+        with self._lock:
+            if (self._epoch, self._generations.get(key, 0)) != generation:
+                return   # invalidated while loading: the vectors may predate an ingest
+            self._entries.put(key, entry)
+            self.loads += 1
+
+    def invalidate(self, repo_full: str, pr_number: int):
+        key = (repo_full, pr_number)
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+            self._entries.pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._generations.clear()
+            self._entries.clear()
+
+    def entry(self, repo_full: str, pr_number: int,
+              loader: Callable[[], Tuple[list, list, list, list]]) -> Optional[_PrVectors]:
+        """The PR's resident vectors, loaded through `loader` -> (ids, documents, metadatas, embeddings) if needed"""
+        key = (repo_full, pr_number)
+        entry = self._get(key)
+        if entry is None:
+            generation = self._generation(key)
+            ids, documents, metadatas, embeddings = loader()
+            if not ids:
+                return None
+            entry = _PrVectors(ids, documents, metadatas, embeddings, self.dtype)
+            self._put(key, entry, generation)
+        return entry
+
+    def search(self, repo_full: str, pr_number: int, query_embedding, top_k: int,
+               loader: Callable[[], Tuple[list, list, list, list]],
+               files: Optional[Iterable[str]] = None) -> List[Tuple[str, dict]]:
+        """Top-k (document, metadata) pairs by cosine similarity"""
+        entry = self.entry(repo_full, pr_number, loader)
+        if entry is None:
+            return []
+        return entry.rows(entry.top_k(query_embedding, top_k, files))
+
+    def stats(self) -> dict:
+        return {
+            "prs": len(self._entries),
+            "bytes": self._entries.bytes,
+            "dtype": self.dtype,
+            "hits": self.hits,
+            "loads": self.loads,
+            "evictions": self._entries.evictions,
+        }
+
+
+# Global instance
+pr_index = None
+
+def get_pr_index() -> PrVectorIndex:
+    """Get or create the per-process PR vector index"""
+    global pr_index
+    if pr_index is None:
+        pr_index = PrVectorIndex()
+    return pr_index
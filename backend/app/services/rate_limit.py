@@ -0,0 +1,187 @@
+# app/services/rate_limit.py
+import os
+import time
+import heapq
+import asyncio
+import hashlib
+import itertools
+from contextlib import asynccontextmanager
+from typing import Optional
+import httpx
+
+from .http import get_http_client
+
+# Request priorities: lower runs first
+PRIORITY_INTERACTIVE = 0   # user waiting on an OAuth/profile call
+PRIORITY_REVIEW = 1        # webhook-driven review pipeline
+PRIORITY_BULK = 2          # repo sync, PR listing, backfills
+
+GITHUB_HOURLY_LIMIT = int(os.getenv("GITHUB_HOURLY_LIMIT", "5000"))
+GITHUB_BURST = int(os.getenv("GITHUB_BURST", "20"))                       # token bucket capacity
+GITHUB_BULK_RESERVE = int(os.getenv("GITHUB_BULK_RESERVE", "200"))        # quota kept back from bulk work
+GITHUB_RATE_LIMIT_RETRIES = int(os.getenv("GITHUB_RATE_LIMIT_RETRIES", "3"))
+GITHUB_SECONDARY_BACKOFF = float(os.getenv("GITHUB_SECONDARY_BACKOFF", "60"))  # GitHub asks for >= 1 minute
+GITHUB_MAX_BACKOFF = float(os.getenv("GITHUB_MAX_BACKOFF", "900"))
+
+
+class GitHubRateLimited(Exception):
+    """Raised when a request is still rate limited after all retries"""
+
+
+class TokenScheduler:
+    """Paces requests made with one GitHub token.
+
+    A token bucket refilled at the rate that spreads the remaining quota (from
+    `X-RateLimit-Remaining`/`X-RateLimit-Reset`) over the rest of the window keeps us
+    just under GitHub's limit instead of bursting into it. Waiters are served by
+    priority, bulk work stops while the quota is inside the reserve kept for
+    interactive calls, and `Retry-After` / secondary limits pause the token with
+    exponential backoff.
+    """
+
+    def __init__(self):
+        self.capacity = GITHUB_BURST
+        self.tokens = float(GITHUB_BURST)
+        self.rate = GITHUB_HOURLY_LIMIT / 3600.0
+        self.remaining: Optional[int] = None
+        self.reset_at: Optional[float] = None
+        self.blocked_until = 0.0
+        self.backoff = 0.0
+        self.throttled = 0
+        self._updated = time.monotonic()
+        self._waiters = []
+        self._seq = itertools.count()
+        self._cond = asyncio.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _delay(self, priority: int) -> float:
+        """Seconds until a request of `priority` may be sent"""
+        now = time.monotonic()
+        if self.blocked_until > now:
+            return self.blocked_until - now
+        if self.reset_at is not None and now >= self.reset_at:
+            # Window rolled over; assume a fresh quota until headers say otherwise
+            self.remaining, self.reset_at = None, None
+            self.rate = GITHUB_HOURLY_LIMIT / 3600.0
+        if priority >= PRIORITY_BULK and self.remaining is not None and self.remaining <= GITHUB_BULK_RESERVE:
+            return max((self.reset_at or now) - now, 1.0)
+        self._refill()
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else 1.0
+
+    async def acquire(self, priority: int = PRIORITY_REVIEW):
+        entry = (priority, next(self._seq))
+        async with self._cond:
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    is_next = self._waiters[0] == entry
+                    delay = self._delay(priority) if is_next else None
+                    if is_next and delay <= 0:
+                        heapq.heappop(self._waiters)
+                        self.tokens -= 1
+                        return
+                    try:
+                        await asyncio.wait_for(self._cond.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+            except BaseException:
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                raise
+            finally:
+                self._cond.notify_all()
+
+    def observe(self, response: httpx.Response) -> bool:
+        """Update pacing from response headers; returns True if the request was throttled"""
+        headers = response.headers
+        now = time.monotonic()
+        if "x-ratelimit-remaining" in headers and "x-ratelimit-reset" in headers:
+            self.remaining = int(headers["x-ratelimit-remaining"])
+            seconds_left = max(int(headers["x-ratelimit-reset"]) - time.time(), 1.0)
+            self.reset_at = now + seconds_left
+            self._refill()
+            self.rate = max(self.remaining, 0) / seconds_left
+
+        throttled = response.status_code == 429 or (
+            response.status_code == 403 and (
+                headers.get("x-ratelimit-remaining") == "0"
+                or "retry-after" in headers
+                or "rate limit" in response.text.lower()
+            )
+        )
+        if not throttled:
+            self.backoff = 0.0
+            return False
+
+        self.throttled += 1
+        if "retry-after" in headers:
+            wait = float(headers["retry-after"])
+        elif headers.get("x-ratelimit-remaining") == "0" and self.reset_at:
+            wait = self.reset_at - now
+        else:
+            # Secondary limit without guidance: back off exponentially
+            self.backoff = min(max(self.backoff * 2, GITHUB_SECONDARY_BACKOFF), GITHUB_MAX_BACKOFF)
+            wait = self.backoff
+        self.blocked_until = max(self.blocked_until, now + wait)
+        print(f"⏳ GitHub rate limit hit ({response.status_code}); pausing token for {wait:.0f}s")
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "remaining": self.remaining,
+            "rate_per_second": round(self.rate, 3),
+            "blocked_for": max(self.blocked_until - time.monotonic(), 0.0),
+            "queued": len(self._waiters),
+            "throttled": self.throttled,
+        }
+
+
+_schedulers = {}
+
+def get_scheduler(headers: dict) -> TokenScheduler:
+    """Scheduler for the token in `headers` (one per token, anonymous calls share one)"""
+    auth = headers.get("Authorization", "")
+    key = hashlib.sha256(auth.encode()).hexdigest()[:16] if auth else "anonymous"
+    if key not in _schedulers:
+        _schedulers[key] = TokenScheduler()
+    return _schedulers[key]
+
+async def scheduled_request(method: str, url: str, headers: dict, priority: int = PRIORITY_REVIEW, **kwargs) -> httpx.Response:
+    """Send a GitHub request through its token's scheduler, retrying when throttled"""
+    scheduler = get_scheduler(headers)
+    for _ in range(GITHUB_RATE_LIMIT_RETRIES + 1):
+        await scheduler.acquire(priority)
+        response = await get_http_client().request(method, url, headers=headers, **kwargs)
+        if not scheduler.observe(response):
+            return response
+    raise GitHubRateLimited(f"GitHub kept rate limiting {method} {url}")
+
+@asynccontextmanager
+async def scheduled_stream(method: str, url: str, headers: dict, priority: int = PRIORITY_REVIEW,
+                           follow_redirects: bool = False, **kwargs):
+    """Like `scheduled_request`, but yields a response whose body has not been read yet"""
+    scheduler = get_scheduler(headers)
+    client = get_http_client()
+    for _ in range(GITHUB_RATE_LIMIT_RETRIES + 1):
+        await scheduler.acquire(priority)
+        request = client.build_request(method, url, headers=headers, **kwargs)
+        response = await client.send(request, stream=True, follow_redirects=follow_redirects)
+        try:
+            if response.status_code in (403, 429):
+                await response.aread()  # throttling is detected from the body too
+            if not scheduler.observe(response):
+                yield response
+                return
+        finally:
+            await response.aclose()
+    raise GitHubRateLimited(f"GitHub kept rate limiting {method} {url}")
+
+def get_rate_limit_stats() -> list:
+    return [scheduler.stats() for scheduler in _schedulers.values()]
@@ -0,0 +1,23 @@
+# app/services/retrieval_cache.py
+import os
+
+from .lru import LRUCache
+
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "2048"))
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "4096"))
+
+
+def normalize_question(question: str) -> str:
+    """Whitespace-insensitive key for a question (case is kept: it can change the embedding)"""
+    return " ".join(question.split())
+
+
+# Global instances
+# question text -> embedding
+query_embedding_cache = LRUCache(QUERY_EMBEDDING_CACHE_SIZE)
+# (repo, PR, PR content version, question, top_k, files) -> ranked chunk IDs;
+# a re-ingest changes the version, so stale results are simply never looked up again
+retrieval_cache = LRUCache(RETRIEVAL_CACHE_SIZE)
+
+def get_retrieval_cache_stats() -> dict:
+    return {"query_embeddings": query_embedding_cache.stats(), "retrievals": retrieval_cache.stats()}
@@ -1,7 +1,12 @@
 import os
+from collections import Counter
+from typing import Optional
 from dotenv import load_dotenv
 import ollama
-from .embedding import get_pr_chunks, semantic_search_pr
+from .chunk_selection import collapse_duplicates, estimate_tokens, CHARS_PER_TOKEN, SUMMARY_TOKEN_BUDGET
+from .chunker import CHUNK_MAX_CHARS
+from .executors import llm_map_executor
+from .embedding import get_pr_chunks, get_pr_files, get_pr_summary_chunks, semantic_search_pr
 
 load_dotenv()
 
@@ -22,6 +27,29 @@ Please provide:
 Format your response in clear markdown with appropriate headers and emojis.
 """
 
+FILE_NOTES_PROMPT = """You are an expert code reviewer. You are reviewing one part of a large GitHub pull request; other parts are reviewed separately.
+
+Diff chunks for {files}:
+
+{chunks}
+
+In at most {words} words of markdown bullet points, note what changed in these files, how it changed, and any concerns (bugs, risks, missing tests). Do not add headers or an overall assessment.
+"""
+
+REDUCE_PROMPT = """You are an expert code reviewer analyzing a large GitHub pull request. It was reviewed in parts; these are the notes for each part:
+
+{notes}
+{unseen}
+Combine the notes into one code review summary of the whole pull request. Please provide:
+1. 🔍 **Overview**: Brief description of what changed
+2. 📁 **Files & Components**: Key files and components affected  
+3. 🔧 **Change Type**: Type of changes (feature, bugfix, refactor, etc.)
+4. ⚠️ **Potential Concerns**: Any issues or improvements needed
+5. ✅ **Overall Assessment**: Final assessment and recommendations
+
+Format your response in clear markdown with appropriate headers and emojis.
+"""
+
 QA_PROMPT = """You are an expert code reviewer. Based on the following code changes context, answer the user's question accurately and comprehensively.
 
 Code changes context:
@@ -32,8 +60,66 @@ Question: {question}
 Please provide a detailed and helpful answer based on the code changes shown above. Use markdown formatting and be specific about file names, functions, and changes when relevant.
 """
 
-def get_ollama_response(prompt: str, model: str = "llama3.2") -> str:
-    """Get response from Ollama (local LLM)"""
+UPDATE_PROMPT = """You are an expert code reviewer. New commits were pushed to a GitHub pull request you already reviewed.
+
+Your current review:
+
+{previous}
+
+The new commits touched these files: {files}
+{removed}
+What the new commits changed in those files:
+
+{chunks}
+
+Rewrite the review so it describes the pull request as it is now. Keep every part of the current review that is still accurate and only revise what the touched files affect. Keep the same sections, markdown headers and emojis.
+"""
+
+# Summaries: "single" sends one prompt of selected chunks; "map_reduce" writes notes per
+# group of files concurrently and merges them; "auto" uses map-reduce only when the PR
+# does not fit in one prompt's budget
+SUMMARY_MODE = os.getenv("SUMMARY_MODE", "auto").lower()
+SUMMARY_MAP_MAX_GROUPS = int(os.getenv("SUMMARY_MAP_MAX_GROUPS", "8"))   # per-file-group calls per summary (bounds cost)
+SUMMARY_MAP_NOTE_WORDS = int(os.getenv("SUMMARY_MAP_NOTE_WORDS", "150"))  # upper bound; notes also share one prompt budget
+
+REPEATED_FILES_SHOWN = 10  # file names listed in a "repeated in" note
+
+SUMMARY_HEADER = "# 🤖 AI Review Summary for PR #{pr_number}\n\n"
+SUMMARY_FOOTER = "\n\n---\n*Generated using Ollama (local LLM) + ChromaDB with sentence-transformers embeddings - 100% free!*"
+
+def _summary_body(summary: str) -> str:
+    """Strip the header/footer (and any notes after them) that make_summary wraps around the LLM text"""
+    body = summary.split("\n\n", 1)[1] if summary.startswith("# 🤖") and "\n\n" in summary else summary
+    return body.split("\n\n---\n", 1)[0]
+
+def _label_chunk(document: str, metadata: dict) -> str:
+    """Prefix a chunk with its file, language and line range so the LLM can cite them"""
+    if not metadata or not metadata.get("file"):
+        return document
+    label = f"File: {metadata['file']} ({metadata.get('language', 'text')}"
+    if metadata.get("new_start"):
+        label += f", lines {metadata['new_start']}-{metadata['new_end']}"
+    label += ")"
+    if metadata.get("repeated"):
+        files = metadata.get("repeated_in") or []
+        label += f"\n[Near-identical change repeated {metadata['repeated']} more time(s)"
+        if files:
+            label += f" in {len(files)} other file(s): {', '.join(files[:REPEATED_FILES_SHOWN])}"
+            if len(files) > REPEATED_FILES_SHOWN:
+                label += f" and {len(files) - REPEATED_FILES_SHOWN} more"
+        label += "]"
+    return f"{label}\n{document}"
+
+def _files_mentioned(question: str, files: list) -> list:
+    """PR files whose path or file name appears in the question"""
+    question_lower = question.lower()
+    return [path for path in files if path.lower() in question_lower or path.rsplit("/", 1)[-1].lower() in question_lower]
+
+class LLMError(Exception):
+    """Raised when no Ollama model could answer a prompt"""
+
+def chat_ollama(prompt: str, model: str = "llama3.2") -> str:
+    """Get response from Ollama (local LLM), raising LLMError if it is unavailable"""
     try:
         response = ollama.chat(model=model, messages=[
             {
@@ -53,42 +139,173 @@ def get_ollama_response(prompt: str, model: str = "llama3.2") -> str:
             ])
             return response['message']['content']
         except Exception as e2:
-            return f"❌ **Ollama Error**: {str(e2)}\n\n💡 **Solution**: Make sure Ollama is running and has a model installed:\n```bash\n# Install Ollama\n# Then pull a model:\nollama pull llama3.2\n# Or: ollama pull mistral\n```"
+            raise LLMError(str(e2)) from e2
 
-def make_summary(pr_number: int, top_k: int = 5) -> str:
-    """Generate PR summary using local Ollama LLM + ChromaDB semantic search"""
+def get_ollama_response(prompt: str, model: str = "llama3.2") -> str:
+    """Get response from Ollama (local LLM), or a markdown error for the user to read"""
     try:
-        # Get chunks using ChromaDB with local embeddings
-        chunks = get_pr_chunks(pr_number, top_k)
-        
-        if not chunks:
-            return f"## ❌ No Data Found\n\nNo diff data found for PR #{pr_number}. Please ensure the PR webhook was processed correctly."
-        
-        # Generate summary using Ollama (local LLM)
-        prompt = SUMMARY_PROMPT.format(chunks="\n\n".join(chunks))
-        summary = get_ollama_response(prompt)
-        
-        return f"# 🤖 AI Review Summary for PR #{pr_number}\n\n{summary}\n\n---\n*Generated using Ollama (local LLM) + ChromaDB with sentence-transformers embeddings - 100% free!*"
-        
-    except Exception as e:
-        return f"## ❌ Error Generating Summary\n\nError for PR #{pr_number}: {str(e)}"
+        return chat_ollama(prompt, model)
+    except LLMError as e:
+        return f"❌ **Ollama Error**: {str(e)}\n\n💡 **Solution**: Make sure Ollama is running and has a model installed:\n```bash\n# Install Ollama\n# Then pull a model:\nollama pull llama3.2\n# Or: ollama pull mistral\n```"
+
+def _unseen_files(pr_number: int, repo_full: str, chunks: list) -> list:
+    """PR files with no chunk in `chunks`, counting files a collapsed chunk stands for as seen"""
+    seen = {meta.get("file") for _, meta in chunks}.union(*(meta.get("repeated_in", []) for _, meta in chunks))
+    return sorted(set(get_pr_files(pr_number, repo_full)) - seen)
+
+def _pack(chunks: list, token_budget: int, keep_files: bool) -> list:
+    """Consecutive groups of at most `token_budget` tokens; with `keep_files`, a file that fits in a group is not split"""
+    file_tokens = Counter()
+    for document, metadata in chunks:
+        file_tokens[metadata.get("file")] += estimate_tokens(document)
+    groups, current, used = [], [], 0
+    for document, metadata in chunks:
+        cost = estimate_tokens(document)
+        starts_file = not current or current[-1][1].get("file") != metadata.get("file")
+        whole_file = min(file_tokens[metadata.get("file")], token_budget) if keep_files else cost
+        if current and (used + cost > token_budget or (starts_file and used + whole_file > token_budget)):
+            groups.append(current)
+            current, used = [], 0
+        current.append((document, metadata))
+        used += cost
+    if current:
+        groups.append(current)
+    return groups
+
+def _file_groups(chunks: list, token_budget: int, max_groups: int = SUMMARY_MAP_MAX_GROUPS) -> list:
+    """Split diff-ordered chunks into at most `max_groups` consecutive groups of at most
+    `token_budget` tokens, keeping files together where that does not need more groups.
+
+    make_summary selects at most max_groups * (token_budget - largest chunk) tokens, so
+    plain sequential packing always fits; anything beyond the limit is dropped and its
+    files are named in the reduce prompt.
+    """
+    groups = _pack(chunks, token_budget, keep_files=True)
+    if len(groups) > max_groups:
+        groups = _pack(chunks, token_budget, keep_files=False)
+    return groups[:max_groups]
 
-def make_retrieval_qa(pr_number: int, question: str, top_k: int = 5) -> str:
+def _summarize_single(pr_number: int, repo_full: str, chunks: list) -> str:
+    context = "\n\n".join(_label_chunk(doc, meta) for doc, meta in chunks)
+    unseen = _unseen_files(pr_number, repo_full, chunks)
+    if unseen:
+        context += "\n\nOther files changed (not shown above): " + ", ".join(unseen)
+    return chat_ollama(SUMMARY_PROMPT.format(chunks=context))
+
+def _file_notes(prompt: str) -> Optional[str]:
+    """Map step: notes for one group of files, or None if the LLM failed (the reduce step skips it)"""
+    try:
+        return chat_ollama(prompt)
+    except LLMError as e:
+        print(f"⚠️ Per-file summary call failed: {e}")
+        return None
+
+def _truncate(text: str, tokens: int) -> str:
+    """Cut `text` to about `tokens` tokens at a line boundary"""
+    limit = tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text.rfind("\n", 0, limit)
+    return text[:cut if cut > 0 else limit].rstrip() + "\n…"
+
+def _summarize_map_reduce(pr_number: int, repo_full: str, chunks: list, token_budget: int) -> str:
+    """Write notes for each group of files concurrently (LLM_MAP_THREADS), then merge them in one call.
+
+    The notes share one prompt budget, so the reduce prompt is no larger than a
+    single-call summary prompt whatever the number of groups.
+    """
+    groups = _file_groups(chunks, token_budget)
+    note_tokens = token_budget // len(groups)
+    prompts = []
+    for group in groups:
+        files = list(dict.fromkeys(meta.get("file") or "unknown file" for _, meta in group))
+        prompts.append(FILE_NOTES_PROMPT.format(
+            files=", ".join(f"`{path}`" for path in files),
+            chunks="\n\n".join(_label_chunk(doc, meta) for doc, meta in group),
+            words=max(20, min(SUMMARY_MAP_NOTE_WORDS, note_tokens * 3 // 4)),
+        ))
+    print(f"🗂️ Map-reduce summary of PR #{pr_number}: {len(chunks)} chunks in {len(groups)} group(s)")
+    notes = list(llm_map_executor.map(_file_notes, prompts))
+
+    parts = [(group, note) for group, note in zip(groups, notes) if note is not None]
+    if not parts:
+        raise LLMError(f"all {len(groups)} per-file summary calls failed")
+    sections = []
+    for group, note in parts:
+        files = ", ".join(dict.fromkeys(meta.get("file") or "unknown file" for _, meta in group))
+        sections.append(f"### {files}\n{_truncate(note.strip(), note_tokens)}")
+    missing = _unseen_files(pr_number, repo_full, [chunk for group, _ in parts for chunk in group])
+    return chat_ollama(REDUCE_PROMPT.format(
+        notes="\n\n".join(sections),
+        unseen=f"\nOther files changed (not covered by the notes): {', '.join(missing)}\n" if missing else "",
+    ))
+
+def make_summary(pr_number: int, repo_full: str, token_budget: int = SUMMARY_TOKEN_BUDGET) -> str:
+    """Generate PR summary using local Ollama LLM + ChromaDB semantic search.
+
+    LLMError propagates so the review queue retries the job instead of posting the
+    error as the review.
+    """
+    # Pick the chunks that best cover the whole PR (by embedding); map-reduce may spread them over several prompts
+    if SUMMARY_MODE == "single":
+        selection_budget = token_budget
+    else:
+        # Leave each group room for its last chunk so sequential packing needs at most SUMMARY_MAP_MAX_GROUPS groups
+        chunk_tokens = estimate_tokens("x" * CHUNK_MAX_CHARS)
+        selection_budget = max(token_budget, (token_budget - chunk_tokens) * SUMMARY_MAP_MAX_GROUPS)
+    chunks = get_pr_summary_chunks(pr_number, repo_full, selection_budget)
+    
+    if not chunks:
+        return f"## ❌ No Data Found\n\nNo diff data found for PR #{pr_number}. Please ensure the PR webhook was processed correctly."
+    
+    # Generate summary using Ollama (local LLM); small PRs keep the single call
+    total = sum(estimate_tokens(doc) for doc, _ in chunks)
+    if SUMMARY_MODE == "map_reduce" or (SUMMARY_MODE == "auto" and total > token_budget):
+        summary = _summarize_map_reduce(pr_number, repo_full, chunks, token_budget)
+    else:
+        summary = _summarize_single(pr_number, repo_full, chunks)
+    
+    return SUMMARY_HEADER.format(pr_number=pr_number) + summary + SUMMARY_FOOTER
+
+def make_incremental_summary(pr_number: int, previous_summary: str, changed_files: set, delta: list,
+                             reverted: list = ()) -> str:
+    """Revise an existing PR summary from what the new commits changed (LLMError propagates).
+
+    `delta` holds (path, chunk) pairs of the compare diff since the summary was written;
+    `reverted` lists touched files that no longer differ from the base branch.
+    """
+    prompt = UPDATE_PROMPT.format(
+        previous=_summary_body(previous_summary),
+        files=", ".join(f"`{path}`" for path in sorted(changed_files)),
+        removed=f"These files no longer differ from the base branch: {', '.join(reverted)}\n" if reverted else "",
+        chunks="\n\n".join(f"File: {path}\n{chunk}" for path, chunk in delta) or "(no text changes in these files)",
+    )
+    summary = chat_ollama(prompt)
+
+    return SUMMARY_HEADER.format(pr_number=pr_number) + summary + SUMMARY_FOOTER
+
+def make_retrieval_qa(pr_number: int, repo_full: str, question: str, top_k: int = 5) -> str:
     """Answer questions using semantic search + local Ollama LLM"""
     try:
-        # Use semantic search to find most relevant chunks for the question
-        relevant_chunks = semantic_search_pr(pr_number, question, top_k)
+        # Use semantic search to find most relevant chunks, within the files the question names
+        mentioned = _files_mentioned(question, get_pr_files(pr_number, repo_full))
+        relevant_chunks, vectors = semantic_search_pr(
+            pr_number, repo_full, question, top_k * 2, files=mentioned or None, with_metadata=True, with_vectors=True
+        )
+        if relevant_chunks:
+            # Over-fetched so that collapsing repeats of the same change still leaves top_k distinct chunks
+            _, relevant_chunks = collapse_duplicates(relevant_chunks, vectors, "qa", limit=top_k)
         
         if not relevant_chunks:
             # Fallback to regular retrieval if semantic search fails
-            relevant_chunks = get_pr_chunks(pr_number, top_k)
+            relevant_chunks = get_pr_chunks(pr_number, repo_full, top_k, with_metadata=True)
         
         if not relevant_chunks:
             return f"## ❌ No Data Available\n\nNo diff data found for PR #{pr_number}. Please ensure the PR webhook was processed correctly."
         
         # Answer question using Ollama with relevant context
         prompt = QA_PROMPT.format(
-            context="\n\n".join(relevant_chunks),
+            context="\n\n".join(_label_chunk(doc, meta) for doc, meta in relevant_chunks),
             question=question
         )
         answer = get_ollama_response(prompt)
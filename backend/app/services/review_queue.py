@@ -0,0 +1,267 @@
+# app/services/review_queue.py
+import os
+import asyncio
+from typing import Optional
+
+from ..db import crud
+from ..db.database import SessionLocal
+from .github import stream_diff, fetch_compare_diff, fetch_gitattributes, post_comment, DiffCaps
+from .diff_parser import DiffParser, diff_header_paths
+from .chunker import chunk_diff
+from .file_classifier import FileClassifier
+from .embedding import ingest_diff, gc_stale_chunks, get_pr_files, delete_pr_chunks
+from .review import make_summary, make_incremental_summary
+from .executors import run_io, run_llm
+
+# Queue configuration
+REVIEW_WORKERS = int(os.getenv("REVIEW_WORKERS", "2"))
+REVIEW_POLL_INTERVAL = float(os.getenv("REVIEW_POLL_INTERVAL", "2.0"))      # seconds between idle polls
+REVIEW_MAX_ATTEMPTS = int(os.getenv("REVIEW_MAX_ATTEMPTS", "3"))
+REVIEW_RETRY_DELAY = float(os.getenv("REVIEW_RETRY_DELAY", "30"))           # base backoff, doubled per attempt
+REVIEW_LEASE_SECONDS = float(os.getenv("REVIEW_LEASE_SECONDS", "1800"))     # processing rows older than this are re-queued
+REVIEW_DEBOUNCE_SECONDS = float(os.getenv("REVIEW_DEBOUNCE_SECONDS", "20"))  # quiet period before a burst of pushes is reviewed
+REVIEW_DEBOUNCE_MAX_WAIT = float(os.getenv("REVIEW_DEBOUNCE_MAX_WAIT", "120"))  # upper bound on how long a burst can defer review
+CHUNK_TTL_SECONDS = float(os.getenv("CHUNK_TTL_SECONDS", str(30 * 24 * 3600)))  # chunks of closed/untracked PRs idle this long are dropped
+WEBHOOK_DELIVERY_TTL = float(os.getenv("WEBHOOK_DELIVERY_TTL", str(3 * 24 * 3600)))  # GitHub allows manual redelivery for 3 days
+
+
+class ReviewSuperseded(Exception):
+    """Raised inside the pipeline when a newer head was queued for the same PR"""
+
+
+class ReviewJob:
+    """Snapshot of a claimed review row, safe to pass between threads"""
+
+    def __init__(self, review_id: int, pr_number: int, repo_full: str, diff_url: str, head_sha: Optional[str],
+                 claim_token: Optional[str] = None, reviewed_sha: Optional[str] = None,
+                 previous_summary: Optional[str] = None, generated_overrides: Optional[str] = None):
+        self.review_id = review_id
+        self.pr_number = pr_number
+        self.repo_full = repo_full
+        self.diff_url = diff_url
+        self.head_sha = head_sha
+        self.claim_token = claim_token   # proves this worker still holds the lease
+        self.reviewed_sha = reviewed_sha
+        self.previous_summary = previous_summary
+        self.generated_overrides = generated_overrides
+
+    @property
+    def can_review_incrementally(self) -> bool:
+        return bool(
+            self.reviewed_sha and self.head_sha and self.reviewed_sha != self.head_sha
+            and self.previous_summary and self.previous_summary.startswith("# 🤖")
+        )
+
+
+def _claim_job() -> Optional[ReviewJob]:
+    db = SessionLocal()
+    try:
+        review = crud.claim_next_review(db)
+        if review is None:
+            return None
+        return ReviewJob(
+            review.id, review.pr_number, review.repository.full_name, review.diff_url, review.head_sha,
+            claim_token=review.claim_token, reviewed_sha=review.reviewed_sha, previous_summary=review.summary,
+            generated_overrides=review.repository.generated_overrides,
+        )
+    finally:
+        db.close()
+
+
+def _with_session(fn, *args):
+    db = SessionLocal()
+    try:
+        return fn(db, *args)
+    finally:
+        db.close()
+
+
+def _ensure_current(job: ReviewJob):
+    if not _with_session(crud.is_review_current, job.review_id, job.claim_token):
+        raise ReviewSuperseded(f"PR #{job.pr_number} moved past {job.head_sha}")
+
+
+class ReviewResult:
+    """Outcome of one pipeline run"""
+
+    def __init__(self, summary: str, diff_truncated: Optional[str] = None):
+        self.summary = summary
+        self.diff_truncated = diff_truncated
+
+
+async def run_review_pipeline(job: ReviewJob) -> ReviewResult:
+    """Fetch, embed, summarize and comment on one PR.
+
+    If the PR was reviewed before, the compare diff since the reviewed head tells
+    which files the new commits touched and what they changed; only those files are
+    re-embedded, from the PR diff so the index keeps describing base...head, and
+    the stored summary is revised rather than rewritten. Between stages the job
+    checks that its head is still the one queued for the PR, so a pipeline overtaken
+    by a newer push stops before spending more LLM time and, crucially, before
+    posting a comment about a stale head.
+    """
+    # Parse while streaming: binary files are dropped on arrival, generated/vendored files keep only their header
+    classifier = FileClassifier(await fetch_gitattributes(job.repo_full, job.head_sha), job.generated_overrides or "")
+    changed_files = delta = None
+    # Incremental reviews build on stored chunks; after a close/reopen or TTL GC there are none left
+    stored_files = set(await run_io(get_pr_files, job.pr_number, job.repo_full)) if job.can_review_incrementally else set()
+    if stored_files:
+        compare = await fetch_compare_diff(
+            job.repo_full, job.reviewed_sha, job.head_sha, DiffParser(stub_file=classifier.classify_path)
+        )
+        if compare is not None:
+            changed_files = {path for file in compare.files for path in (file.old_path, file.new_path)}
+            changed_files.update(compare.skipped_files)   # binary files: drop any chunks they had
+            delta = [(chunk.file, chunk.text) for chunk in chunk_diff(compare)]
+            del compare
+
+    caps = DiffCaps()
+    keep_file = (lambda old, new: old in changed_files or new in changed_files) if changed_files is not None else None
+    parser = DiffParser(keep_file=keep_file, stub_file=classifier.classify_path)
+    pr_files = set()   # every path of the PR diff, kept or not
+    async for line in stream_diff(job.diff_url, caps):
+        if line.startswith("diff --git "):
+            pr_files.update(diff_header_paths(line))
+        parser.feed(line)
+    parsed_diff = parser.finish()
+    del parser
+    if await run_io(classifier.stub_generated, parsed_diff):
+        print(f"🧹 PR #{job.pr_number}: stubbed {classifier.stubbed_files} generated/vendored file(s), "
+              f"skipped {classifier.skipped_bytes / 1024:.0f} KB of diff")
+    if changed_files is not None:
+        # Files only a merge of the base branch touched are not part of the PR; reverted files lose their chunks
+        reverted = sorted((changed_files & stored_files) - pr_files)
+        changed_files &= pr_files | stored_files
+        generated = {file.path for file in parsed_diff.stubbed_files}
+        delta = [(path, text) for path, text in delta if path in changed_files and path not in generated]
+    await run_io(_ensure_current, job)
+    await run_io(ingest_diff, job.pr_number, job.repo_full, parsed_diff, changed_files)
+    del parsed_diff
+    await run_io(_ensure_current, job)
+    if changed_files is None:
+        summary = await run_llm(make_summary, job.pr_number, job.repo_full)
+    elif not changed_files:
+        print(f"🔁 PR #{job.pr_number}: no file of the PR changed since {job.reviewed_sha[:7]}; keeping its review")
+        summary = job.previous_summary
+    else:
+        print(f"🔁 Incremental review of PR #{job.pr_number}: {len(changed_files)} file(s) changed since {job.reviewed_sha[:7]}")
+        summary = await run_llm(make_incremental_summary, job.pr_number, job.previous_summary, changed_files, delta, reverted)
+    if caps.truncated and "**Partial review:**" not in summary:
+        summary += f"\n\n> ⚠️ **Partial review:** the diff was too large and was truncated ({caps.truncated})."
+    await run_io(_ensure_current, job)
+    await post_comment(job.pr_number, job.repo_full, summary)
+    return ReviewResult(summary, caps.truncated)
+
+
+class ReviewWorkerPool:
+    """Asyncio workers draining the `pull_request_reviews` table.
+
+    Rows in `pending` are claimed with a compare-and-set into `processing`, then end up
+    in `done` or, after `REVIEW_MAX_ATTEMPTS`, in `failed`. Because the queue lives in the
+    database, deliveries accepted by the webhook survive restarts: rows whose lease
+    expired are put back to `pending` when the pool starts and periodically afterwards.
+    """
+
+    def __init__(self, workers: int = REVIEW_WORKERS, poll_interval: float = REVIEW_POLL_INTERVAL):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._tasks = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        requeued = await run_io(_with_session, crud.requeue_stale_reviews, REVIEW_LEASE_SECONDS)
+        if requeued:
+            print(f"♻️ Re-queued {requeued} interrupted review(s)")
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._reaper()))
+        print(f"✅ Review worker pool started with {self.workers} worker(s)")
+
+    async def stop(self):
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        """Wake idle workers after a job was enqueued"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _idle(self):
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    async def _worker(self, worker_id: int):
+        while not self._stopping:
+            try:
+                job = await run_io(_claim_job)
+            except Exception as e:
+                print(f"❌ Review worker {worker_id} could not poll the queue: {e}")
+                job = None
+            if job is None:
+                await self._idle()
+                continue
+            await self._process(worker_id, job)
+
+    async def _process(self, worker_id: int, job: ReviewJob):
+        print(f"🔄 Worker {worker_id} reviewing PR #{job.pr_number} ({job.repo_full})")
+        try:
+            result = await run_review_pipeline(job)
+        except asyncio.CancelledError:
+            # Shutting down: hand the job back so the next start picks it up
+            await asyncio.shield(run_io(_with_session, crud.release_review, job.review_id, job.claim_token))
+            raise
+        except ReviewSuperseded:
+            if await run_io(_with_session, crud.is_review_closed, job.review_id):
+                # Closed mid-pipeline: the close handler may have run before this job stored its chunks
+                await run_io(delete_pr_chunks, job.pr_number, job.repo_full)
+                print(f"⏭️ Dropped review of PR #{job.pr_number}; it was closed")
+                return
+            print(f"⏭️ Dropped stale review of PR #{job.pr_number} at {job.head_sha}; a newer head is queued or its lease expired")
+            return
+        except Exception as e:
+            status = await run_io(
+                _with_session, crud.fail_review, job.review_id, job.claim_token, str(e), REVIEW_MAX_ATTEMPTS, REVIEW_RETRY_DELAY
+            )
+            print(f"❌ Review of PR #{job.pr_number} failed ({status.value if status else 'superseded'}): {e}")
+            return
+        if await run_io(
+            _with_session, crud.complete_review, job.review_id, job.claim_token, job.head_sha, result.summary, result.diff_truncated
+        ):
+            print(f"✅ Review of PR #{job.pr_number} done")
+
+    async def _reaper(self):
+        while not self._stopping:
+            await asyncio.sleep(max(REVIEW_LEASE_SECONDS / 4, self.poll_interval))
+            try:
+                requeued = await run_io(_with_session, crud.requeue_stale_reviews, REVIEW_LEASE_SECONDS)
+                if requeued:
+                    print(f"♻️ Re-queued {requeued} review(s) with expired leases")
+                    self.notify()
+                await run_io(_with_session, crud.purge_deliveries, WEBHOOK_DELIVERY_TTL)
+                open_prs = await run_io(_with_session, crud.list_open_prs)
+                removed = await run_io(gc_stale_chunks, CHUNK_TTL_SECONDS, open_prs)
+                if removed:
+                    print(f"🧹 Removed {removed} chunk(s) of closed PRs idle for over {CHUNK_TTL_SECONDS / 86400:.0f} day(s)")
+            except Exception as e:
+                print(f"❌ Queue housekeeping failed: {e}")
+
+
+# Global instance
+review_worker_pool = None
+
+def get_review_worker_pool():
+    """Get or create the review worker pool"""
+    global review_worker_pool
+    if review_worker_pool is None:
+        review_worker_pool = ReviewWorkerPool()
+    return review_worker_pool
@@ -0,0 +1,112 @@
+# app/services/similar_changes.py
+import os
+from typing import List, Optional
+import numpy as np
+
+from .embedding import encode_query, held_vectors, get_history_target
+from .compaction import RERANK_OVERSAMPLE
+
+SIMILAR_MAX_QUERY_CHUNKS = int(os.getenv("SIMILAR_MAX_QUERY_CHUNKS", "40"))  # chunks of the source PR used as queries
+SIMILAR_NEIGHBOURS_PER_CHUNK = int(os.getenv("SIMILAR_NEIGHBOURS_PER_CHUNK", "20"))
+SIMILAR_EXCLUDED_MAX_EXTRA = int(os.getenv("SIMILAR_EXCLUDED_MAX_EXTRA", "50"))  # extra ANN results fetched to make up for a skipped PR
+
+# Queries fetch a few extra neighbours and drop the excluded PR's hits in Python: a `where`
+# filter makes Chroma resolve the allowed IDs over the whole collection before every search
+
+
+def _hunk_result(document: str, metadata: dict, distance: float) -> dict:
+    return {
+        "pr_number": metadata.get("pr"),
+        "file": metadata.get("file"),
+        "language": metadata.get("language"),
+        "new_start": metadata.get("new_start"),
+        "new_end": metadata.get("new_end"),
+        "similarity": round(1.0 - float(distance), 4),   # cosine space: distance = 1 - similarity
+        "text": document,
+    }
+
+
+def find_similar_hunks(repo_full: str, text: str, top_k: int = 10, exclude_pr: Optional[int] = None) -> List[dict]:
+    """Past hunks of the repository most similar to `text`.
+
+    On a PCA-compacted history index the ANN query over-fetches and the candidates are
+    re-ranked on the full-precision embeddings already stored for them; a candidate with
+    none (evicted from the embedding cache) keeps its projected similarity.
+    """
+    history, projection = get_history_target(repo_full)
+    if history.count() == 0:
+        return []
+    query = encode_query(text)
+    extra = 0
+    if exclude_pr is not None:
+        extra = min(len(history.get(where={"pr": exclude_pr}, include=[])["ids"]), SIMILAR_EXCLUDED_MAX_EXTRA)
+    results = history.query(
+        query_embeddings=(projection.project(query) if projection is not None else query).tolist(),
+        n_results=(top_k * RERANK_OVERSAMPLE if projection is not None else top_k) + extra,
+    )
+    kept = [i for i, metadata in enumerate(results["metadatas"][0]) if exclude_pr is None or metadata.get("pr") != exclude_pr]
+    ids = [results["ids"][0][i] for i in kept]
+    documents = [results["documents"][0][i] for i in kept]
+    metadatas = [results["metadatas"][0][i] for i in kept]
+    similarities = [1.0 - float(results["distances"][0][i]) for i in kept]   # cosine space
+    if projection is not None and documents:
+        target = query[0] / max(float(np.linalg.norm(query[0])), 1e-12)
+        for i, vector in enumerate(held_vectors(repo_full, ids, documents)):
+            if vector is not None:
+                similarities[i] = float(vector @ target / max(float(np.linalg.norm(vector)), 1e-12))
+    ranked = sorted(range(len(documents)), key=lambda i: similarities[i], reverse=True)[:top_k]
+    return [_hunk_result(documents[i], metadatas[i], 1.0 - similarities[i]) for i in ranked]
+
+def find_similar_prs(repo_full: str, pr_number: int, top_k: int = 10) -> List[dict]:
+    """Other PRs of the repository whose changes look most like `pr_number`'s.
+
+    Each of the PR's chunks (a sample of them for very large PRs) is used as an ANN
+    query in one batched call; a candidate PR scores the average over the query chunks
+    of its best match, so a PR that resembles the whole change ranks above one that
+    shares a single boilerplate hunk.
+    """
+    history, _ = get_history_target(repo_full)   # source and candidates share the same (maybe projected) space
+    source = history.get(where={"pr": pr_number}, include=["embeddings", "metadatas"])
+    rows = [
+        (embedding, metadata) for embedding, metadata in zip(source["embeddings"], source["metadatas"])
+        if not metadata.get("generated")
+    ]
+    if not rows:
+        return []
+    extra = min(len(source["metadatas"]), SIMILAR_EXCLUDED_MAX_EXTRA)   # the PR's own chunks come back too
+    if len(rows) > SIMILAR_MAX_QUERY_CHUNKS:
+        picks = np.linspace(0, len(rows) - 1, SIMILAR_MAX_QUERY_CHUNKS).astype(int)
+        rows = [rows[i] for i in picks]
+
+    results = history.query(
+        query_embeddings=[list(map(float, embedding)) for embedding, _ in rows],
+        n_results=SIMILAR_NEIGHBOURS_PER_CHUNK + extra,
+        include=["metadatas", "distances"],
+    )
+
+    candidates = {}
+    for (_, source_meta), metadatas, distances in zip(rows, results["metadatas"], results["distances"]):
+        best_per_pr = {}
+        for metadata, distance in zip(metadatas, distances):
+            similarity = 1.0 - float(distance)
+            other = metadata["pr"]
+            if other == pr_number:
+                continue
+            if similarity > best_per_pr.get(other, (-1.0, None))[0]:
+                best_per_pr[other] = (similarity, metadata.get("file"))
+        for other, (similarity, other_file) in best_per_pr.items():
+            entry = candidates.setdefault(other, {"total": 0.0, "matched_chunks": 0, "files": set()})
+            entry["total"] += similarity
+            entry["matched_chunks"] += 1
+            entry["files"].add(other_file)
+
+    ranked = sorted(candidates.items(), key=lambda item: item[1]["total"], reverse=True)[:top_k]
+    return [
+        {
+            "pr_number": other,
+            "score": round(entry["total"] / len(rows), 4),
+            "matched_chunks": entry["matched_chunks"],
+            "files": sorted(path for path in entry["files"] if path),
+        }
+        for other, entry in ranked
+    ]
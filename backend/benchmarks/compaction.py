@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Report index size and recall@k of compacted embeddings (float16, int8, PCA) against
+exact float32 search, with and without re-ranking on full-precision vectors, using
+vectors already stored in the embedding cache. Optionally fit and save the PCA
+projection used by the history indexes (HISTORY_PCA_DIMS).
+
+Usage (from backend/):
+    python benchmarks/compaction.py                         # report only
+    python benchmarks/compaction.py --dims 64 128 192 --save 128
+"""
+import argparse
+import os
+import sqlite3
+import sys
+
+import numpy as np
+
+# Add the backend directory to the Python path so we can import app modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.compaction import PcaProjection, quantize_int8, EMBEDDING_PCA_PATH, RERANK_OVERSAMPLE
+from app.services.embedding_backends import EMBEDDING_BACKEND
+from app.services.embedding_cache import EMBEDDING_CACHE_PATH
+
+CACHE_KEY = f"{os.getenv('EMBEDDING_MODEL', 'sentence-transformers/all-MiniLM-L6-v2')}@{EMBEDDING_BACKEND}"
+
+
+def load_sample(path: str, model: str, limit: int) -> np.ndarray:
+    conn = sqlite3.connect(path)
+    rows = conn.execute(
+        "SELECT vector FROM embeddings WHERE model = ? ORDER BY RANDOM() LIMIT ?", (model, limit)
+    ).fetchall()
+    conn.close()
+    return np.stack([np.frombuffer(blob, dtype=np.float32) for (blob,) in rows]) if rows else np.zeros((0, 0))
+
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    return matrix / np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def recall(expected: np.ndarray, actual: np.ndarray) -> float:
+    return float(np.mean([len(set(e) & set(a)) / len(e) for e, a in zip(expected, actual)]))
+
+
+def reranked(candidates: np.ndarray, queries: np.ndarray, corpus: np.ndarray, k: int) -> np.ndarray:
+    out = []
+    for query, ids in zip(queries, candidates):
+        exact = corpus[ids] @ query
+        out.append(ids[np.argsort(-exact)[:k]])
+    return np.array(out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cache", default=EMBEDDING_CACHE_PATH, help="embedding cache database")
+    parser.add_argument("--model", default=CACHE_KEY, help="cache key (model@backend) to sample")
+    parser.add_argument("--sample", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--dims", type=int, nargs="+", default=[64, 128, 192])
+    parser.add_argument("--save", type=int, help=f"fit PCA with this many dims on the whole sample and save it to {EMBEDDING_PCA_PATH}")
+    args = parser.parse_args()
+
+    vectors = load_sample(args.cache, args.model, args.sample)
+    if len(vectors) <= args.queries + args.top_k * RERANK_OVERSAMPLE:
+        sys.exit(f"Only {len(vectors)} vectors in {args.cache}; ingest more PRs first")
+    vectors = normalize(vectors.astype(np.float32))
+    queries, corpus = vectors[:args.queries], vectors[args.queries:]
+    k, wide = args.top_k, args.top_k * RERANK_OVERSAMPLE
+    expected = top_k(queries @ corpus.T, k)
+    dim = corpus.shape[1]
+
+    print(f"=== {len(corpus)} vectors x {dim} dims, {len(queries)} queries, recall@{k}, re-rank oversample x{RERANK_OVERSAMPLE} ===")
+    print(f"{'variant':<18}{'bytes/vec':>10}{'index MB':>10}{'recall':>9}{'+rerank':>9}")
+
+    def report(name: str, bytes_per_vector: int, scores: np.ndarray):
+        raw = recall(expected, top_k(scores, k))
+        fixed = recall(expected, reranked(top_k(scores, wide), queries, corpus, k))
+        size_mb = bytes_per_vector * len(corpus) / 1024 / 1024
+        print(f"{name:<18}{bytes_per_vector:>10}{size_mb:>10.1f}{raw:>9.3f}{fixed:>9.3f}")
+
+    report("float32", dim * 4, queries @ corpus.T)
+    report("float16", dim * 2, (queries.astype(np.float16) @ corpus.astype(np.float16).T).astype(np.float32))
+    codes, scales = quantize_int8(corpus)
+    report("int8", dim + 4, (queries @ codes.astype(np.float32).T) * scales[:, 0])
+
+    fit_on = corpus[:min(len(corpus), 10000)]
+    for dims in args.dims:
+        if dims >= dim:
+            continue
+        projection = PcaProjection.fit(fit_on, dims)
+        scores = projection.project(queries) @ projection.project(corpus).T
+        report(f"pca{dims} ({projection.explained_variance:.0%})", dims * 4, scores)
+
+    if args.save:
+        projection = PcaProjection.fit(vectors, args.save)
+        projection.save(EMBEDDING_PCA_PATH)
+        print(f"\nSaved {args.save}-dim projection ({projection.explained_variance:.0%} of variance) to {EMBEDDING_PCA_PATH}")
+        print(f"Set HISTORY_PCA_DIMS={args.save} to store history indexes in the projected space; "
+              f"existing history is copied into them in the background on the next start")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Compare the torch and ONNX int8 embedding backends on real diff chunks:
+throughput, vector agreement and top-k retrieval agreement.
+
+Usage (from backend/):
+    python benchmarks/embedding_backends.py                      # chunks from this repo's git history
+    python benchmarks/embedding_backends.py --diff some.patch --queries 50 --top-k 5
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+# Add the backend directory to the Python path so we can import app modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.diff_parser import parse_diff
+from app.services.chunker import chunk_diff
+from app.services.embedding_backends import load_embedding_model
+
+MODEL_NAME = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+
+
+def load_chunks(diff_path: str, commits: int, limit: int) -> list:
+    if diff_path:
+        with open(diff_path, encoding="utf-8", errors="replace") as f:
+            diff = f.read()
+    else:
+        diff = subprocess.run(
+            ["git", "log", "-p", f"-n{commits}", "--format="], capture_output=True, text=True, check=True
+        ).stdout
+    return [chunk.text for chunk in chunk_diff(parse_diff(diff))][:limit]
+
+
+def time_encode(model, texts: list, batch_size: int, repeats: int):
+    model.encode(texts[:batch_size], batch_size=batch_size)  # warm-up
+    best, vectors = None, None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        vectors = np.asarray(model.encode(texts, batch_size=batch_size), dtype=np.float32)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return vectors, best
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+
+def top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    scores = queries @ corpus.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--diff", help="diff/patch file to chunk (default: git log -p of the current repo)")
+    parser.add_argument("--commits", type=int, default=300)
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    texts = load_chunks(args.diff, args.commits, args.chunks)
+    if len(texts) <= args.top_k:
+        sys.exit("Not enough chunks to benchmark; pass --diff or run inside a repo with history")
+    print(f"=== {len(texts)} chunks, avg {sum(map(len, texts)) / len(texts):.0f} chars, batch {args.batch_size} ===")
+
+    results = {}
+    for backend in ("torch", "onnx"):
+        start = time.perf_counter()
+        model = load_embedding_model(MODEL_NAME, backend)
+        load_time = time.perf_counter() - start
+        vectors, elapsed = time_encode(model, texts, args.batch_size, args.repeats)
+        results[backend] = normalize(vectors)
+        print(f"{backend:>5}: load {load_time:6.1f}s | encode {elapsed:6.2f}s | {len(texts) / elapsed:7.1f} chunks/s")
+
+    torch_vecs, onnx_vecs = results["torch"], results["onnx"]
+    cosine = (torch_vecs * onnx_vecs).sum(axis=1)
+    print(f"\n=== VECTOR AGREEMENT ===\ncosine(torch, onnx): mean {cosine.mean():.4f} | min {cosine.min():.4f}")
+
+    # Use a sample of chunks as queries against the whole corpus, excluding the chunk itself
+    rng = np.random.default_rng(0)
+    picks = rng.choice(len(texts), size=min(args.queries, len(texts)), replace=False)
+    k = args.top_k
+    expected = top_k(torch_vecs, torch_vecs[picks], k + 1)[:, 1:]
+    actual = top_k(onnx_vecs, onnx_vecs[picks], k + 1)[:, 1:]
+    overlap = np.mean([len(set(e) & set(a)) / k for e, a in zip(expected, actual)])
+    same_first = np.mean(expected[:, 0] == actual[:, 0])
+    print(f"\n=== RETRIEVAL AGREEMENT ({len(picks)} queries) ===")
+    print(f"top-{k} overlap: {overlap:.3f} | same top-1: {same_first:.3f}")
+
+
+if __name__ == "__main__":
+    main()
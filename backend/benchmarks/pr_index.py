@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Compare per-PR top-k search through Chroma (metadata filter + HNSW) with the
+in-memory exact index in app/services/pr_index.py, on synthetic unit vectors.
+
+Usage (from backend/):
+    python benchmarks/pr_index.py --prs 200 --chunks 300 --queries 200
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# Add the backend directory to the Python path so we can import app modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import chromadb
+from chromadb.config import Settings
+from app.services.pr_index import PrVectorIndex
+
+
+def unit_vectors(rng, count: int, dim: int) -> np.ndarray:
+    vectors = rng.standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def percentile_ms(samples: list, q: float) -> float:
+    return float(np.percentile(samples, q) * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prs", type=int, default=200, help="PRs stored in the collection")
+    parser.add_argument("--chunks", type=int, default=300, help="chunks per PR")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--dtype", default="float32", choices=["float32", "float16"])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    store_dir = tempfile.mkdtemp(prefix="pr-index-bench-")
+    try:
+        client = chromadb.PersistentClient(path=store_dir, settings=Settings(anonymized_telemetry=False))
+        collection = client.get_or_create_collection("bench")
+        step = client.get_max_batch_size()
+        print(f"=== Loading {args.prs} PRs x {args.chunks} chunks ({args.dim} dims) ===")
+        for pr in range(args.prs):
+            vectors = unit_vectors(rng, args.chunks, args.dim)
+            ids = [f"{pr}-{i}" for i in range(args.chunks)]
+            for start in range(0, args.chunks, step):
+                collection.add(
+                    ids=ids[start:start + step],
+                    embeddings=vectors[start:start + step].tolist(),
+                    documents=[f"chunk {i}" for i in range(start, min(start + step, args.chunks))],
+                    metadatas=[{"pr": pr, "idx": i, "file": f"f{i % 20}.py"} for i in range(start, min(start + step, args.chunks))],
+                )
+
+        queries = unit_vectors(rng, args.queries, args.dim)
+        targets = rng.integers(0, args.prs, size=args.queries)
+
+        chroma_times, chroma_results = [], []
+        for query, pr in zip(queries, targets):
+            start = time.perf_counter()
+            result = collection.query(query_embeddings=[query.tolist()], where={"pr": int(pr)}, n_results=args.top_k)
+            chroma_times.append(time.perf_counter() - start)
+            chroma_results.append(result["documents"][0])
+
+        index = PrVectorIndex(dtype=args.dtype)
+
+        def loader(pr: int):
+            data = collection.get(where={"pr": pr}, include=["documents", "metadatas", "embeddings"])
+            return data["ids"], data["documents"], data["metadatas"], data["embeddings"]
+
+        # First pass loads each PR's matrix on first touch
+        first_times, index_results = [], []
+        for query, pr in zip(queries, targets):
+            pr = int(pr)
+            start = time.perf_counter()
+            hits = index.search("bench", pr, query, args.top_k, loader=lambda: loader(pr))
+            first_times.append(time.perf_counter() - start)
+            index_results.append([document for document, _ in hits])
+
+        # Second pass: every PR is resident now
+        warm_times = []
+        for query, pr in zip(queries, targets):
+            pr = int(pr)
+            start = time.perf_counter()
+            index.search("bench", pr, query, args.top_k, loader=lambda: loader(pr))
+            warm_times.append(time.perf_counter() - start)
+
+        agreement = np.mean([len(set(a) & set(b)) / args.top_k for a, b in zip(chroma_results, index_results)])
+        print(f"\nchroma query      : p50 {percentile_ms(chroma_times, 50):7.3f} ms | p95 {percentile_ms(chroma_times, 95):7.3f} ms")
+        print(f"index (first pass): p50 {percentile_ms(first_times, 50):7.3f} ms | p95 {percentile_ms(first_times, 95):7.3f} ms")
+        print(f"index (resident)  : p50 {percentile_ms(warm_times, 50):7.3f} ms | p95 {percentile_ms(warm_times, 95):7.3f} ms")
+        print(f"top-{args.top_k} agreement with chroma (HNSW is approximate): {agreement:.3f}")
+        print(f"index memory: {index.stats()['bytes'] / 1024 / 1024:.1f} MB for {index.stats()['prs']} PRs ({args.dtype})")
+    finally:
+        shutil.rmtree(store_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
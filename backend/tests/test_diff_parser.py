@@ -0,0 +1,102 @@
+from app.services.diff_parser import DiffParser, parse_diff
+
+
+RENAME = """diff --git a/old/name.py b/new/name.py
+similarity index 90%
+rename from old/name.py
+rename to new/name.py
+index 1111111..2222222 100644
+--- a/old/name.py
++++ b/new/name.py
+@@ -1,3 +1,3 @@ def main():
+ import os
+-x = 1
++x = 2
+ print(x)"""
+
+BINARY = """diff --git a/logo.svg b/logo.svg
+index 1111111..2222222 100644
+Binary files a/logo.svg and b/logo.svg differ
+diff --git a/app.py b/app.py
+--- a/app.py
++++ b/app.py
+@@ -1 +1 @@
+-a
++b"""
+
+NO_NEWLINE = """diff --git a/README b/README
+--- a/README
++++ b/README
+@@ -1,2 +1,2 @@
+ title
+-old last line
+\\ No newline at end of file
++new last line
+\\ No newline at end of file"""
+
+
+def test_rename_keeps_both_paths_and_counts():
+    parsed = parse_diff(RENAME)
+    assert len(parsed.files) == 1
+    file = parsed.files[0]
+    assert (file.old_path, file.new_path, file.path) == ("old/name.py", "new/name.py", "new/name.py")
+    assert (file.additions, file.deletions) == (1, 1)
+    hunk = file.hunks[0]
+    assert hunk.section == "def main():"
+    assert hunk.range_label == "-1,3 +1,3"
+    assert list(parsed.hunk_changes(hunk)) == [(" ", "import os"), ("-", "x = 1"), ("+", "x = 2"), (" ", "print(x)")]
+
+
+def test_binary_file_is_skipped_without_losing_the_next_file():
+    parsed = parse_diff(BINARY)
+    assert parsed.skipped_files == ["logo.svg"]
+    assert [f.path for f in parsed.files] == ["app.py"]
+    assert (parsed.additions, parsed.deletions) == (1, 1)
+    assert parsed.lines[0] == "diff --git a/app.py b/app.py"
+
+
+def test_binary_file_is_kept_and_flagged_when_not_skipping():
+    parsed = parse_diff(BINARY, skip_binary=False)
+    assert [f.is_binary for f in parsed.files] == [True, False]
+
+
+def test_no_newline_marker_is_kept_but_not_counted():
+    parsed = parse_diff(NO_NEWLINE)
+    file = parsed.files[0]
+    assert (file.additions, file.deletions) == (1, 1)
+    hunk = file.hunks[0]
+    assert parsed.lines[hunk.end - 1] == "\\ No newline at end of file"
+    assert [kind for kind, _ in parsed.hunk_changes(hunk)] == [" ", "-", "+"]
+
+
+def test_headerless_lines_parse_as_one_anonymous_file():
+    parsed = parse_diff("+foo\n-bar")
+    assert len(parsed.files) == 1
+    assert parsed.files[0].path == ""
+    assert (parsed.additions, parsed.deletions) == (1, 1)
+    assert [(kind, content) for _, kind, content in parsed.iter_changes()] == [("+", "foo"), ("-", "bar")]
+    assert not parsed.files[0].hunks[0].has_header
+
+
+def test_headerless_hunk_keeps_its_line_numbers():
+    parsed = parse_diff("@@ -10,2 +10,2 @@\n a\n-b\n+c")
+    hunk = parsed.files[0].hunks[0]
+    assert hunk.has_header and hunk.range_label == "-10,2 +10,2"
+    assert (parsed.additions, parsed.deletions) == (1, 1)
+
+
+def test_preamble_before_the_first_header_is_dropped():
+    patch = "From 123 Mon Sep 17 00:00:00 2001\nSubject: [PATCH] fix\n---\n a.py | 2 +-\n\n" + BINARY
+    parsed = parse_diff(patch)
+    assert [f.path for f in parsed.files] == ["app.py"]
+    assert (parsed.additions, parsed.deletions) == (1, 1)
+
+
+def test_stubbed_file_counts_lines_but_keeps_no_hunks():
+    parser = DiffParser(stub_file=lambda old, new: "generated" if new.endswith(".py") else None)
+    for line in RENAME.split("\n"):
+        parser.feed(line)
+    file = parser.finish().files[0]
+    assert file.generated == "generated"
+    assert file.hunks == []
+    assert (file.additions, file.deletions) == (1, 1)
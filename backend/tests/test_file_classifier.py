@@ -0,0 +1,35 @@
+from app.services.file_classifier import FileClassifier
+
+
+def classify(path: str, gitattributes: str = "", overrides: str = ""):
+    return FileClassifier(gitattributes, overrides).classify_path(path, path)
+
+
+def test_lockfiles_and_minified_assets_match_at_any_depth():
+    assert classify("package-lock.json") == "generated"
+    assert classify("frontend/package-lock.json") == "generated"
+    assert classify("static/js/app.min.js") == "generated"
+
+
+def test_build_output_and_dependencies_match_in_nested_directories():
+    assert classify("frontend/build/static/js/main.3f2a.js") == "generated"
+    assert classify("packages/a/dist/index.js") == "generated"
+    assert classify("src/__snapshots__/a.js") == "generated"
+    assert classify("frontend/node_modules/x/index.js") == "vendored"
+    assert classify("services/api/vendor/lib/x.go") == "vendored"
+
+
+def test_directory_rules_still_match_at_the_root():
+    assert classify("dist/index.js") == "generated"
+    assert classify("node_modules/x/index.js") == "vendored"
+
+
+def test_source_files_are_not_classified():
+    assert classify("backend/app/main.py") is None
+    assert classify("frontend/src/builder.js") is None
+    assert classify("src/distance.py") is None
+
+
+def test_gitattributes_and_overrides_win_over_defaults():
+    assert classify("frontend/build/keep.js", "**/build/** -linguist-generated") is None
+    assert classify("docs/api/index.html", overrides="docs/api/** linguist-generated") == "generated"
@@ -0,0 +1,193 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db import crud, models
+from app.db.database import Base
+from app.db.schemas import ReviewCreate
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def repo(db):
+    return crud.get_or_create_repository(db, "octo/app", github_id=1)
+
+
+def enqueue(db, repo, head_sha="a1", **kwargs):
+    return crud.enqueue_review(db, repo.id, 7, head_sha, "https://example.test/7.diff", **kwargs)
+
+
+def age(db, review, **fields):
+    """Move timestamps of a review into the past"""
+    for name, seconds in fields.items():
+        setattr(review, name, getattr(review, name) - timedelta(seconds=seconds))
+    db.commit()
+
+
+def test_claim_moves_one_due_review_to_processing(db, repo):
+    enqueue(db, repo)
+    review = crud.claim_next_review(db)
+    assert review.status == models.ReviewStatus.processing
+    assert review.attempts == 1 and review.claim_token
+    assert crud.is_review_current(db, review.id, review.claim_token)
+    assert crud.claim_next_review(db) is None
+
+
+def test_rows_without_a_diff_url_are_not_jobs(db, repo):
+    crud.create_review(db, ReviewCreate(pr_number=8, repo_id=repo.id))
+    assert crud.claim_next_review(db) is None
+
+
+def test_complete_records_the_reviewed_head(db, repo):
+    enqueue(db, repo)
+    review = crud.claim_next_review(db)
+    assert crud.complete_review(db, review.id, review.claim_token, "a1", "summary")
+    db.refresh(review)
+    assert review.status == models.ReviewStatus.done
+    assert (review.reviewed_sha, review.claim_token, review.queued_at) == ("a1", None, None)
+
+
+def test_expired_lease_fences_off_the_old_worker(db, repo):
+    enqueue(db, repo)
+    first = crud.claim_next_review(db)
+    first_token = first.claim_token
+    age(db, first, started_at=120)
+    assert crud.requeue_stale_reviews(db, lease_seconds=60) == 1
+    second = crud.claim_next_review(db)
+    assert second.id == first.id and second.claim_token != first_token
+
+    assert not crud.is_review_current(db, first.id, first_token)
+    assert not crud.complete_review(db, first.id, first_token, "a1", "stale")
+    assert crud.fail_review(db, first.id, first_token, "boom", 3, 30) is None
+    crud.release_review(db, first.id, first_token)
+    db.refresh(second)
+    assert second.status == models.ReviewStatus.processing
+    assert crud.complete_review(db, second.id, second.claim_token, "a1", "fresh")
+
+
+def test_live_lease_is_not_requeued(db, repo):
+    enqueue(db, repo)
+    crud.claim_next_review(db)
+    assert crud.requeue_stale_reviews(db, lease_seconds=60) == 0
+
+
+def test_failures_back_off_then_give_up(db, repo):
+    enqueue(db, repo)
+    review = crud.claim_next_review(db)
+    before = datetime.utcnow()
+    assert crud.fail_review(db, review.id, review.claim_token, "boom", 2, 30) == models.ReviewStatus.pending
+    db.refresh(review)
+    assert review.last_error == "boom" and review.claim_token is None
+    assert review.available_at >= before + timedelta(seconds=30)
+    assert crud.claim_next_review(db) is None   # still backing off
+
+    age(db, review, available_at=3600)
+    review = crud.claim_next_review(db)
+    assert review.attempts == 2
+    assert crud.fail_review(db, review.id, review.claim_token, "boom again", 2, 30) == models.ReviewStatus.failed
+    db.refresh(review)
+    assert review.status == models.ReviewStatus.failed
+
+
+def test_release_does_not_count_the_attempt(db, repo):
+    enqueue(db, repo)
+    review = crud.claim_next_review(db)
+    crud.release_review(db, review.id, review.claim_token)
+    db.refresh(review)
+    assert (review.status, review.attempts, review.claim_token) == (models.ReviewStatus.pending, 0, None)
+
+
+def test_duplicate_delivery_is_recorded_once(db, repo):
+    assert crud.record_delivery(db, "guid-1", "pull_request")
+    enqueue(db, repo)   # commits the delivery with the job
+    assert not crud.record_delivery(db, "guid-1", "pull_request")
+    assert crud.record_delivery(db, "guid-2", "pull_request")
+
+
+def test_repository_is_matched_by_github_id_across_renames(db, repo):
+    renamed = crud.get_or_create_repository(db, "octo/renamed", github_id=1)
+    recased = crud.get_or_create_repository(db, "Octo/Renamed", github_id=1)
+    assert renamed.id == recased.id == repo.id
+    assert recased.full_name == "Octo/Renamed"
+    assert db.query(models.Repository).count() == 1
+
+
+def test_pushes_within_the_debounce_window_collapse_into_one_job(db, repo):
+    first = enqueue(db, repo, "a1", debounce=20, max_wait=120)
+    assert crud.claim_next_review(db) is None   # still debouncing
+    second = enqueue(db, repo, "a2", debounce=20, max_wait=120)
+    assert second.id == first.id and second.head_sha == "a2"
+    assert second.queued_at == first.queued_at
+    assert second.available_at > datetime.utcnow()
+
+
+def test_max_wait_caps_how_long_a_burst_defers_review(db, repo):
+    review = enqueue(db, repo, "a1", debounce=20, max_wait=120)
+    age(db, review, queued_at=150)
+    review = enqueue(db, repo, "a2", debounce=20, max_wait=120)
+    assert review.available_at <= datetime.utcnow()
+    assert crud.claim_next_review(db).head_sha == "a2"
+
+
+def test_new_head_supersedes_a_processing_review(db, repo):
+    enqueue(db, repo, "a1")
+    running = crud.claim_next_review(db)
+    token = running.claim_token
+    enqueue(db, repo, "a2")
+    assert not crud.is_review_current(db, running.id, token)
+    assert not crud.complete_review(db, running.id, token, "a1", "stale")
+    assert crud.claim_next_review(db).head_sha == "a2"
+
+
+def test_same_head_redelivery_leaves_a_processing_review_alone(db, repo):
+    enqueue(db, repo, "a1")
+    running = crud.claim_next_review(db)
+    enqueue(db, repo, "a1")
+    db.refresh(running)
+    assert running.status == models.ReviewStatus.processing
+    assert crud.is_review_current(db, running.id, running.claim_token)
+    assert crud.claim_next_review(db) is None
+
+
+def test_push_during_a_long_review_starts_a_new_burst(db, repo):
+    review = enqueue(db, repo, "a1", debounce=20, max_wait=120)
+    age(db, review, queued_at=300, available_at=300)
+    running = crud.claim_next_review(db)
+    assert running.queued_at is None
+    review = enqueue(db, repo, "a2", debounce=20, max_wait=120)
+    assert review.available_at > datetime.utcnow()   # debounced again, not claimable at once
+    assert crud.claim_next_review(db) is None
+
+
+def test_close_cancels_the_review_and_reopen_queues_it_again(db, repo):
+    enqueue(db, repo, "a1")
+    running = crud.claim_next_review(db)
+    closed = crud.close_review(db, repo.id, 7)
+    assert closed.status == models.ReviewStatus.failed and closed.closed_at is not None
+    assert not crud.is_review_current(db, running.id, running.claim_token)
+    assert crud.is_review_closed(db, running.id)
+    assert crud.list_open_prs(db) == {}
+
+    reopened = enqueue(db, repo, "a1")
+    assert reopened.status == models.ReviewStatus.pending and reopened.closed_at is None
+    assert crud.list_open_prs(db) == {"octo/app": {7}}
+
+
+def test_close_keeps_the_last_finished_review(db, repo):
+    enqueue(db, repo, "a1")
+    review = crud.claim_next_review(db)
+    crud.complete_review(db, review.id, review.claim_token, "a1", "summary")
+    enqueue(db, repo, "a2")
+    closed = crud.close_review(db, repo.id, 7)
+    assert (closed.status, closed.head_sha, closed.summary) == (models.ReviewStatus.done, "a1", "summary")